@@ -0,0 +1,119 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import bump_version, get_version
+
+
+def user_version_name(user_id):
+    return 'auth:{}'.format(user_id)
+
+
+class TokenCache:
+    """Кэш «токен -> пользователь» для TokenAuthentication.
+
+    В каждом воркере — ограниченный LRU с TTL; при AUTH_TOKEN_CACHE_SHARED
+    записи дублируются в общий кэш, чтобы промах в одном воркере не шёл
+    в БД. Каждая запись хранит версию auth:<user_id>: выход, смена пароля
+    или сохранение пользователя меняют её, и записи во всех воркерах
+    перестают совпадать. С общим кэшем (файловым или в БД) версия
+    видна всем воркерам сразу; с locmem — только своему, а в остальных
+    запись доживает до ttl. Поэтому ttl — верхняя граница, за которую
+    отзыв токена доходит до всех воркеров.
+    """
+
+    def __init__(self, size, ttl, shared=False, metrics_hook=None):
+        self.size = size
+        self.ttl = ttl
+        self.shared = shared
+        self.metrics_hook = (import_string(metrics_hook) if metrics_hook
+                             else None)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = {'local': 0, 'shared': 0, 'miss': 0}
+
+    def shared_key(self, key):
+        return 'auth_token:{}'.format(key)
+
+    def record(self, source):
+        self.stats[source] += 1
+        if self.metrics_hook:
+            self.metrics_hook(source, self.hit_rate())
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        return (total - self.stats['miss']) / total if total else 0.0
+
+    def is_valid(self, entry):
+        user, version, expires = entry
+        return (expires > time.monotonic()
+                and version == get_version(user_version_name(user.pk)))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        source = 'local'
+        if entry is None and self.shared:
+            entry = cache.get(self.shared_key(key))
+            if entry is not None:
+                user, version = entry
+                entry = (user, version, time.monotonic() + self.ttl)
+                source = 'shared'
+        if entry is None or not self.is_valid(entry):
+            self.record('miss')
+            return None
+        if source == 'shared':
+            self.store_local(key, entry)
+        self.record(source)
+        # Копия: один объект не должен попасть в параллельные запросы.
+        return copy.copy(entry[0])
+
+    def store_local(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def set(self, key, user):
+        version = get_version(user_version_name(user.pk))
+        self.store_local(key, (user, version, time.monotonic() + self.ttl))
+        if self.shared:
+            cache.set(self.shared_key(key), (user, version), self.ttl)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.shared:
+            cache.delete(self.shared_key(key))
+
+    def invalidate_user(self, user_id):
+        bump_version(user_version_name(user_id))
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE,
+    settings.AUTH_TOKEN_CACHE_TTL,
+    shared=settings.AUTH_TOKEN_CACHE_SHARED,
+    metrics_hook=settings.AUTH_TOKEN_CACHE_METRICS_HOOK
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
@@ -0,0 +1,131 @@
+import threading
+from collections import defaultdict
+
+from .cache import get_version, ingredients_catalog
+
+from recipes.models import Ingredient  # isort:skip
+
+TERMINAL = None
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class IngredientIndex:
+    """Префиксное дерево и триграммный индекс по названиям ингредиентов.
+
+    Индекс живёт в памяти воркера и собирается при первом поиске.
+    Версия справочника ингредиентов (см. cache.Catalog) показывает,
+    не устарел ли он из-за записи в другом процессе.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = None
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.items = {}
+        self.keys = {}
+        self.trie = {}
+        self.trigrams = defaultdict(set)
+
+    def _add(self, item):
+        key = normalize(item['name'])
+        self.items[item['id']] = item
+        self.keys[item['id']] = key
+        node = self.trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(TERMINAL, set()).add(item['id'])
+        for trigram in trigrams(key):
+            self.trigrams[trigram].add(item['id'])
+
+    def _remove(self, pk):
+        key = self.keys.pop(pk, None)
+        if key is None:
+            return
+        del self.items[pk]
+        node = self.trie
+        for char in key:
+            node = node[char]
+        node[TERMINAL].discard(pk)
+        for trigram in trigrams(key):
+            self.trigrams[trigram].discard(pk)
+
+    def build(self):
+        version = get_version(self.catalog.name)
+        self._reset()
+        for item in Ingredient.objects.values('id', 'name',
+                                              'measurement_unit'):
+            self._add(item)
+        self.version = version
+
+    def ensure_current(self):
+        if self.version != get_version(self.catalog.name):
+            with self.lock:
+                if self.version != get_version(self.catalog.name):
+                    self.build()
+
+    def update(self, instance, deleted=False):
+        # Правка в этом же процессе применяется на месте, если индекс
+        # соответствовал версии до записи; иначе он пересоберётся сам.
+        with self.lock:
+            current = self.version == get_version(self.catalog.name)
+            version = self.catalog.invalidate()
+            if not current:
+                return
+            self._remove(instance.pk)
+            if not deleted:
+                self._add({'id': instance.pk,
+                           'name': instance.name,
+                           'measurement_unit': instance.measurement_unit})
+            self.version = version
+
+    def _prefix_matches(self, query, limit):
+        node = self.trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            found.extend(sorted(node.get(TERMINAL, ())))
+            stack.extend(node[char] for char in sorted(
+                (char for char in node if char is not TERMINAL),
+                reverse=True
+            ))
+        return found[:limit]
+
+    def _substring_matches(self, query, limit, exclude):
+        groups = sorted((self.trigrams.get(trigram, set())
+                         for trigram in trigrams(query)), key=len)
+        if not groups or not groups[0]:
+            return []
+        candidates = groups[0].intersection(*groups[1:]) - exclude
+        found = [pk for pk in candidates if query in self.keys[pk]]
+        found.sort(key=lambda pk: (self.keys[pk].find(query), self.keys[pk]))
+        return found[:limit]
+
+    def search(self, query, limit):
+        self.ensure_current()
+        query = normalize(query.strip())
+        if not query:
+            return []
+        found = self._prefix_matches(query, limit)
+        if len(found) < limit and len(query) >= 3:
+            found += self._substring_matches(
+                query, limit - len(found), set(found)
+            )
+        return [self.items[pk] for pk in found]
+
+
+ingredients_index = IngredientIndex(ingredients_catalog)
@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .renderers import JSONStreamRenderer
+from .serializers import IngredientSerializer, TagSerializer
+
+from recipes.models import Ingredient, Tag  # isort:skip
+
+
+def get_version(name):
+    key = 'version:{}'.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names):
+    keys = {'version:{}'.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(name):
+    version = time.time()
+    cache.set('version:{}'.format(name), version, None)
+    return version
+
+
+def cache_stream(key, chunks, timeout=None):
+    # Отдаёт части ответа по мере готовности и кладёт в кэш собранное
+    # тело, только если поток дочитан до конца и не слишком велик.
+    content = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if content is not None:
+            content.append(chunk)
+            size += len(chunk)
+            if size > settings.STREAM_CACHE_MAX_SIZE:
+                content = None
+        yield chunk
+    if content is not None:
+        cache.set(key, b''.join(content), timeout)
+
+
+class Catalog:
+    """Справочник, отдаваемый целиком как готовые JSON-байты.
+
+    Каждый воркер держит у себя последнюю собранную версию, общий кэш
+    (CACHES['default']) хранит номер версии и тело ответа для остальных
+    воркеров. Любая запись в таблицу меняет версию через сигналы.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._local = None
+
+    def get(self):
+        version = get_version(self.name)
+        local = self._local
+        if local is not None and local[0] == version:
+            return local
+        key = 'catalog:{}:{}'.format(self.name, version)
+        content = cache.get(key)
+        if content is None:
+            serializer = self.serializer_class()
+            content = b''.join(JSONStreamRenderer().render_items(
+                serializer.to_representation(item)
+                for item in self.queryset.all().iterator()
+            ))
+            cache.set(key, content, settings.CATALOG_CACHE_TIMEOUT)
+        self._local = (version, content)
+        return self._local
+
+    def invalidate(self):
+        return bump_version(self.name)
+
+
+class TagBits:
+    # slug -> номер бита для фильтра по Recipe.tags_mask; пересобирается
+    # при смене версии справочника тэгов.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._local = None
+
+    def get(self):
+        version = get_version(self.catalog.name)
+        local = self._local
+        if local is None or local[0] != version:
+            local = (version, dict(Tag.objects.values_list('slug', 'bit')))
+            self._local = local
+        return local[1]
+
+    def choices(self):
+        return [(slug, slug) for slug in self.get()]
+
+
+tags_catalog = Catalog('tags', Tag.objects.all(), TagSerializer)
+ingredients_catalog = Catalog(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer
+)
+tag_bits = TagBits(tags_catalog)
+
+
+def shopping_cart_key(user_id, file_format):
+    return 'shopping_cart:{}:{}:{}:{}:{}'.format(
+        user_id,
+        get_version('shopping_cart:{}'.format(user_id)),
+        get_version('recipes'),
+        get_version(ingredients_catalog.name),
+        file_format
+    )
@@ -0,0 +1,10 @@
+from django.db.models import F
+
+
+def change_counter(model, pk, field, delta):
+    # Счётчик не уходит в минус, даже если успел разойтись с данными:
+    # такие расхождения исправляет команда recount_counters.
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{field + '__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
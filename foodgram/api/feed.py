@@ -0,0 +1,114 @@
+import heapq
+
+from django.conf import settings
+
+from .pagination import KeysetPagination, keyset_filter
+
+from recipes.models import FeedEntry, Recipe  # isort:skip
+from users.models import Follow, User  # isort:skip
+
+
+def is_pull_author(author):
+    return author.followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out(recipe):
+    # Рецепт раскладывается по лентам подписчиков пачками; авторов
+    # с большой аудиторией читают напрямую при запросе ленты.
+    if is_pull_author(recipe.author):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(FeedEntry(user_id=user_id, recipe=recipe,
+                               pub_date=recipe.pub_date))
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(follow):
+    if is_pull_author(follow.author):
+        return
+    recipes = Recipe.objects.filter(author_id=follow.author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=follow.user_id, recipe_id=recipe_id,
+                   pub_date=pub_date)
+         for recipe_id, pub_date in recipes),
+        ignore_conflicts=True
+    )
+
+
+def return_to_push(author_id):
+    # Автор, опустившийся до порога, снова раскладывается при записи, а
+    # его рецепты за время чтения напрямую в лентах не лежат: досылаем
+    # подписчикам последние, как при новой подписке.
+    if not User.objects.filter(
+            pk=author_id,
+            followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS).exists():
+        return
+    recipes = list(Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE])
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.extend(FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                               pub_date=pub_date)
+                     for recipe_id, pub_date in recipes)
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def forget(follow):
+    FeedEntry.objects.filter(user_id=follow.user_id,
+                             recipe__author_id=follow.author_id).delete()
+
+
+class Feed:
+
+    def __init__(self, user):
+        self.user = user
+
+    def page(self, position, size):
+        pushed = keyset_filter(
+            FeedEntry.objects.filter(user=self.user).order_by(
+                '-pub_date', '-recipe_id'),
+            ('pub_date', 'recipe_id'), position
+        ).values_list('pub_date', 'recipe_id')[:size]
+        pulled = keyset_filter(
+            Recipe.objects.filter(author__in=Follow.objects.filter(
+                user=self.user,
+                author__followers_count__gt=(
+                    settings.FEED_FANOUT_MAX_FOLLOWERS)
+            ).values('author')).order_by('-pub_date', '-id'),
+            ('pub_date', 'id'), position
+        ).values_list('pub_date', 'id')[:size]
+        keys = []
+        seen = set()
+        for key in heapq.merge(pushed, pulled, reverse=True):
+            if key[1] not in seen:
+                seen.add(key[1])
+                keys.append(key)
+        return keys[:size]
+
+
+class FeedPagination(KeysetPagination):
+
+    def get_position(self, item):
+        return item
+
+    def get_count(self, feed, request):
+        return None
+
+    def fetch(self, feed, position, size):
+        return feed.page(position, size)
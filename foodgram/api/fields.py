@@ -1,23 +1,25 @@
-import base64
-
-from django.core.files.base import ContentFile
 from django.forms.models import model_to_dict
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 
 from recipes.models import Tag  # isort:skip
+from .images import process_upload, variant_url  # isort:skip
 
 
 class ImageField(serializers.Field):
 
+    def __init__(self, variant=None, webp=False, **kwargs):
+        self.variant = variant
+        self.webp = webp
+        super().__init__(**kwargs)
+
     def to_representation(self, value):
-        return value.url
+        if self.variant is None:
+            return value.url
+        return variant_url(value, self.variant, self.webp)
 
     def to_internal_value(self, data):
-        format, imgstr = data.split(';base64,')
-        ext = format.split('/')[-1]
-        image = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return image
+        return process_upload(data)
 
 
 class TagsField(serializers.Field):
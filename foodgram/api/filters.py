@@ -1,14 +1,42 @@
-from django_filters import ChoiceFilter, FilterSet, ModelMultipleChoiceFilter
-from rest_framework.filters import SearchFilter
+from django.conf import settings
+from django.db.models import F
+from django_filters import (CharFilter, ChoiceFilter, FilterSet,
+                            MultipleChoiceFilter)
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe, Tag  # isort:skip
+from .autocomplete import ingredients_index
+from .cache import tag_bits
+from .search import search_recipes
 
+from recipes.models import Recipe  # isort:skip
 
-class IngredientSearchFilter(SearchFilter):
+
+class IngredientSearchFilter(BaseFilterBackend):
     search_param = 'name'
+    limit_param = 'limit'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_param])
+        except (KeyError, ValueError):
+            return settings.INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT))
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if not name or view.action != 'list':
+            return queryset
+        return ingredients_index.search(name, self.get_limit(request))
 
 
 class RecipeFilter(FilterSet):
+    ORDERINGS = {
+        'popular': ('-favorites_count', '-shopping_cart_count', '-pub_date'),
+        # Рецепты без недавних добавлений — после всех, от новых к старым.
+        'trending': (F('popularity__score').desc(nulls_last=True),
+                     '-pub_date'),
+    }
+
     is_favorited = ChoiceFilter(
         choices=enumerate([0, 1]),
         method='filter_is_favorited'
@@ -17,16 +45,25 @@ class RecipeFilter(FilterSet):
         choices=enumerate([0, 1]),
         method='filter_is_in_shopping_cart'
     )
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=[(value, value) for value in ORDERINGS],
+        method='filter_ordering'
+    )
     #  author = ModelChoiceFilter(queryset=User.objects.all())
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = MultipleChoiceFilter(
+        choices=tag_bits.choices,
+        method='filter_tags'
+    )
+    tags_match = ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_tags_match'
     )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'tags_match', 'search', 'ordering')
 
     def filter_is_favorited(self, queryset, name, value):
         if int(value) == 1 and not self.request.user.is_anonymous:
@@ -37,3 +74,30 @@ class RecipeFilter(FilterSet):
         if int(value) == 1 and not self.request.user.is_anonymous:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_tags(self, queryset, name, slugs):
+        # Рецепт с любым (tags_match=all — со всеми) из тэгов: проверка
+        # маски в самой таблице рецептов, без JOIN и DISTINCT.
+        match_all = self.form.cleaned_data.get('tags_match') == 'all'
+        bits = tag_bits.get()
+        slugs = set(slugs)
+        if any(bits.get(slug) is None for slug in slugs):
+            if match_all:
+                for slug in slugs:
+                    queryset = queryset.filter(tags__slug=slug)
+                return queryset.distinct()
+            return queryset.filter(tags__slug__in=slugs).distinct()
+        mask = sum(1 << bits[slug] for slug in slugs)
+        if match_all:
+            return queryset.filter(tags_mask__bitall=mask)
+        return queryset.filter(tags_mask__bitany=mask)
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        # Без явного ordering выдача упорядочена по релевантности.
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef, Prefetch
+
+from .cache import get_versions
+from .fast_serializers import serialize_recipes
+from .images import variants_ready
+from .serializers import RecipeGetSerializer
+
+from recipes.models import IngredientInRecipe, Recipe, Tag  # isort:skip
+from users.models import Follow  # isort:skip
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def with_user_flags(queryset, user_id):
+    # Всё, что зависит от пользователя, считается в том же запросе,
+    # что и страница: остальное берётся из кэша фрагментов.
+    return queryset.add_flags(user_id).annotate(is_subscribed=Exists(
+        Follow.objects.filter(user_id=user_id, author=OuterRef('author_id'))
+    ))
+
+
+class RecipeFragmentCache:
+    """Кэш общей для всех пользователей части сериализованного рецепта.
+
+    Ключ включает updated_at рецепта и версии справочников и профиля
+    автора, поэтому старые фрагменты просто перестают читаться. Фрагменты
+    лежат в отдельном кэше cache_alias, версии — в default. Флаги
+    пользователя подставляются в копию фрагмента при каждом запросе.
+    """
+
+    serializer_class = RecipeGetSerializer
+    fields = ('id', 'updated_at', 'pub_date', 'author_id')
+
+    def __init__(self, timeout, cache_alias='fragments'):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+
+    def light_queryset(self, user_id):
+        return with_user_flags(Recipe.objects.only(*self.fields), user_id)
+
+    def full_queryset(self):
+        ingredients = IngredientInRecipe.objects.select_related(
+            'ingredients').order_by('id')
+        return Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')), 'author',
+            Prefetch('ingredient_to_recipe', queryset=ingredients)
+        )
+
+    def get_key(self, recipe, versions):
+        return 'recipe:{}:{}:{}:{}:{}'.format(
+            recipe.id, recipe.updated_at.timestamp(), versions['tags'],
+            versions['ingredients'],
+            versions['author:{}'.format(recipe.author_id)]
+        )
+
+    def build(self, ids, context):
+        if settings.FAST_READ_SERIALIZERS:
+            return serialize_recipes(ids)
+        return self.serialize(ids, context)
+
+    def serialize(self, ids, context):
+        recipes = self.full_queryset().in_bulk(ids)
+        for recipe in recipes.values():
+            for flag in USER_FLAGS:
+                setattr(recipe, flag, False)
+            recipe.author.is_subscribed = False
+        data = self.serializer_class(
+            list(recipes.values()), many=True, context=context
+        ).data
+        return {item['id']: (recipes[item['id']].image, dict(item))
+                for item in data}
+
+    def render(self, recipes, context):
+        if not recipes:
+            return []
+        versions = get_versions({'tags', 'ingredients'} | {
+            'author:{}'.format(recipe.author_id) for recipe in recipes})
+        keys = {recipe.id: self.get_key(recipe, versions)
+                for recipe in recipes}
+        cache = caches[self.cache_alias]
+        fragments = cache.get_many(keys.values())
+        missing = [recipe.id for recipe in recipes
+                   if keys[recipe.id] not in fragments]
+        if missing:
+            built = self.build(missing, context)
+            fresh = {}
+            for pk, (image, fragment) in built.items():
+                fragments[keys[pk]] = fragment
+                if variants_ready(image, 'card'):
+                    fresh[keys[pk]] = fragment
+            cache.set_many(fresh, self.timeout)
+        data = []
+        for recipe in recipes:
+            fragment = fragments.get(keys[recipe.id])
+            if fragment is None:
+                continue
+            item = dict(fragment)
+            for flag in USER_FLAGS:
+                item[flag] = getattr(recipe, flag)
+            item['author'] = dict(item['author'],
+                                  is_subscribed=recipe.is_subscribed)
+            data.append(item)
+        return data
+
+
+recipe_fragments = RecipeFragmentCache(settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
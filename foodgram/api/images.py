@@ -0,0 +1,280 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe  # isort:skip
+
+FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'png',
+}
+# base64 кодирует 3 байта четырьмя символами: куски кратны четырём.
+DECODE_CHUNK_SIZE = 64 * 1024 * 4
+
+
+class LRUSet:
+    # Множество последних size имён: вытесненное имя снова проверяется
+    # по хранилищу (или ещё раз пробует собраться), а память воркера
+    # не растёт с числом картинок.
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def __contains__(self, name):
+        with self.lock:
+            if name not in self.items:
+                return False
+            self.items.move_to_end(name)
+            return True
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, name):
+        with self.lock:
+            self.items[name] = None
+            self.items.move_to_end(name)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+# Имена готовых вариантов: после первой проверки storage.exists
+# повторно не вызывается. Оригиналы, из которых варианты собрать
+# не удалось, отдаются как есть и в очередь больше не ставятся.
+_ready = LRUSet(settings.IMAGE_VARIANT_CACHE_SIZE)
+_failed = LRUSet(settings.IMAGE_VARIANT_CACHE_SIZE)
+
+# Отправляется, когда готовы новые варианты: ответы, выданные до этого
+# с URL оригинала, устарели.
+variants_built = Signal()
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def decode_base64(data, max_size):
+    try:
+        header, encoded = data.split(';base64,', 1)
+    except (AttributeError, ValueError):
+        raise ValidationError('Ожидается изображение в формате data URI '
+                              '(data:image/...;base64,...)')
+    if not header.startswith('data:image/'):
+        raise ValidationError('Загруженный файл не является изображением')
+    if len(encoded) // 4 * 3 > max_size + 2:
+        raise ValidationError('Размер изображения больше {} байт'.format(
+            max_size))
+    buffer = io.BytesIO()
+    try:
+        for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+            buffer.write(base64.b64decode(
+                encoded[start:start + DECODE_CHUNK_SIZE], validate=True))
+            if buffer.tell() > max_size:
+                raise ValidationError(
+                    'Размер изображения больше {} байт'.format(max_size))
+    except binascii.Error:
+        raise ValidationError('Некорректные данные base64')
+    buffer.seek(0)
+    return buffer
+
+
+def open_image(raw):
+    try:
+        image = Image.open(raw)
+        image.verify()
+        raw.seek(0)
+        image = Image.open(raw)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError('Не удалось прочитать изображение')
+    if image.format not in FORMATS:
+        raise ValidationError('Формат {} не поддерживается'.format(
+            image.format))
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение изображения')
+    try:
+        image.load()
+    except OSError:
+        raise ValidationError('Не удалось прочитать изображение')
+    return ImageOps.exif_transpose(image), FORMATS[image.format]
+
+
+def encode(image, extension):
+    # Метаданные (EXIF, GPS и т.п.) не переносятся: изображение
+    # сохраняется заново только из пикселей.
+    buffer = io.BytesIO()
+    if extension == 'jpg':
+        image.convert('RGB').save(buffer, 'JPEG', optimize=True,
+                                  progressive=True,
+                                  quality=settings.IMAGE_QUALITY)
+    elif extension == 'webp':
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image.convert('RGBA' if has_alpha else 'RGB').save(
+            buffer, 'WEBP', quality=settings.IMAGE_QUALITY, method=4)
+    else:
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGBA')
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def process_upload(data):
+    max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+    if isinstance(data, str):
+        raw = decode_base64(data, max_size)
+    elif isinstance(data, UploadedFile):
+        # multipart: файл уже лежит в памяти или во временном файле.
+        if data.size > max_size:
+            raise ValidationError('Размер изображения больше {} байт'.format(
+                max_size))
+        raw = data
+    else:
+        raise ValidationError('Ожидается файл или изображение в base64')
+    image, extension = open_image(raw)
+    content = encode(image, extension)
+    digest = hashlib.sha256(content).hexdigest()
+    return ContentFile(content, name='{}.{}'.format(digest, extension))
+
+
+def variant_name(name, variant, extension=None):
+    # extension — формат варианта; по умолчанию как у оригинала.
+    directory, filename = os.path.split(name)
+    stem, original = os.path.splitext(filename)
+    return os.path.join(directory, 'variants', '{}_{}{}'.format(
+        stem, variant, '.' + extension if extension else original))
+
+
+def fallback_extensions(name):
+    # Варианты без WebP — в JPEG или PNG, как оригинал. Для прочих
+    # оригиналов формат выбирается при сборке по наличию прозрачности,
+    # поэтому по имени известны только кандидаты.
+    extension = os.path.splitext(name)[1][1:].lower()
+    if extension in ('jpg', 'png'):
+        return (extension,)
+    return ('jpg', 'png')
+
+
+def build_variants(name, force=False):
+    storage = get_storage()
+    candidates = fallback_extensions(name)
+    if not force and all(
+            storage.exists(variant_name(name, variant, 'webp'))
+            and any(storage.exists(variant_name(name, variant, extension))
+                    for extension in candidates)
+            for variant in settings.IMAGE_VARIANTS):
+        return []
+    with storage.open(name) as f:
+        original = Image.open(f)
+        original.load()
+    fallback = candidates[0]
+    if len(candidates) > 1 and 'A' in original.getbands():
+        fallback = 'png'
+    created = []
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        if force:
+            for extension in candidates + ('webp',):
+                path = variant_name(name, variant, extension)
+                if storage.exists(path):
+                    storage.delete(path)
+        for extension in (fallback, 'webp'):
+            path = variant_name(name, variant, extension)
+            if not storage.exists(path):
+                storage.save(path, ContentFile(encode(image, extension)))
+                created.append(path)
+            _ready.add(path)
+    return created
+
+
+class VariantBuilder:
+    # Варианты строятся в фоновых потоках процесса, а не в запросе.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.executor = None
+
+    def schedule(self, name):
+        if not name:
+            return
+        with self.lock:
+            if name in self.pending:
+                return
+            self.pending.add(name)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_VARIANT_WORKERS,
+                    thread_name_prefix='image-variants'
+                )
+        self.executor.submit(self.build, name)
+
+    def build(self, name):
+        try:
+            created = build_variants(name)
+        except (OSError, ValueError):
+            # Битый или удалённый оригинал: клиент получит его же URL.
+            _failed.add(name)
+        else:
+            if created:
+                variants_built.send(sender=self.__class__, names=[name])
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+
+variant_builder = VariantBuilder()
+
+
+def find_variant(image, variant, webp):
+    # Имя готового варианта или None, если его ещё нет в хранилище.
+    extensions = ('webp',) if webp else fallback_extensions(image.name)
+    for extension in extensions:
+        path = variant_name(image.name, variant, extension)
+        if path in _ready:
+            return path
+    for extension in extensions:
+        path = variant_name(image.name, variant, extension)
+        if image.storage.exists(path):
+            _ready.add(path)
+            return path
+    return None
+
+
+def variant_url(image, variant, webp=False):
+    # Пока вариант не готов, вместо него отдаётся оригинал, а сборка
+    # ставится в очередь — так работают и старые загрузки без вариантов.
+    # Оригинал не WebP, поэтому image_webp до готовности пуст.
+    if not image:
+        return None
+    if image.name in _failed:
+        return None if webp else image.url
+    path = find_variant(image, variant, webp)
+    if path is None:
+        variant_builder.schedule(image.name)
+        return None if webp else image.url
+    return image.storage.url(path)
+
+
+def variants_ready(image, variant):
+    # Сериализованный ответ с URL оригинала вместо варианта кэшировать
+    # нельзя: после сборки вариантов он устареет.
+    return image.name in _failed or all(
+        any(variant_name(image.name, variant, extension) in _ready
+            for extension in extensions)
+        for extensions in (('webp',), fallback_extensions(image.name)))
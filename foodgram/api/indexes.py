@@ -0,0 +1,74 @@
+import threading
+from datetime import timedelta
+
+from .cache import get_versions
+
+from recipes.models import Recipe  # isort:skip
+
+# Рецепт, сохранённый раньше, чем закоммиченный соседний, может стать
+# видимым позже: перечитываем изменения с запасом.
+SYNC_MARGIN = timedelta(minutes=1)
+SYNC_MAX_RECIPES = 10000
+
+
+class RecipeIndex:
+    """Основа для индексов по рецептам в памяти воркера.
+
+    Индекс собирается при первом обращении. Когда меняется версия
+    рецептов, перечитываются только рецепты с новым updated_at; смена
+    версии одного из справочников из catalogs пересобирает индекс
+    целиком. Подклассы реализуют load_all(), reload(ids) и forget(ids).
+    """
+
+    catalogs = ()
+
+    def __init__(self):
+        self.versions = None
+        self.synced_at = None
+        # Число полных сборок: по нему зависимые кэши видят пересборку.
+        self.builds = 0
+        self.lock = threading.Lock()
+
+    def get_versions(self):
+        names = ('recipes',) + self.catalogs
+        versions = get_versions(names)
+        return tuple(versions[name] for name in names)
+
+    def load_all(self):
+        raise NotImplementedError
+
+    def reload(self, recipe_ids):
+        raise NotImplementedError
+
+    def forget(self, recipe_ids):
+        raise NotImplementedError
+
+    def build(self, versions):
+        self.synced_at = Recipe.objects.order_by('-updated_at').values_list(
+            'updated_at', flat=True).first()
+        self.load_all()
+        self.versions = versions
+        self.builds += 1
+
+    def sync(self, versions):
+        synced_at = self.synced_at
+        if (self.versions is None or synced_at is None
+                or versions[1:] != self.versions[1:]):
+            self.build(versions)
+            return
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=synced_at - SYNC_MARGIN
+        ).values_list('id', 'updated_at')[:SYNC_MAX_RECIPES + 1])
+        if len(changed) > SYNC_MAX_RECIPES:
+            self.build(versions)
+            return
+        self.reload([recipe_id for recipe_id, _ in changed])
+        self.synced_at = max([synced_at] + [at for _, at in changed])
+        self.versions = versions
+
+    def ensure_current(self):
+        versions = self.get_versions()
+        if self.versions != versions:
+            with self.lock:
+                if self.versions != versions:
+                    self.sync(versions)
@@ -0,0 +1,170 @@
+from django.db.models import OuterRef, Subquery
+from rest_framework import serializers
+
+from .pagination import get_recipes_limit
+
+from recipes.models import Favorite, Recipe, ShoppingCart  # isort:skip
+from users.models import Follow  # isort:skip
+
+
+class Loader:
+    """Пакетная загрузка значений по ключам в рамках одного запроса.
+
+    Ключи, собранные со всей страницы, передаются в prime() и
+    загружаются одним batch_load(); load() для уже известного ключа
+    запросов не делает. Экземпляр живёт на объекте запроса.
+    """
+
+    default = None
+
+    def __init__(self, request):
+        self.request = request
+        self.user = getattr(request, 'user', None)
+        self.values = {}
+
+    def batch_load(self, keys):
+        raise NotImplementedError
+
+    def prime(self, keys):
+        missing = {key for key in keys if key not in self.values}
+        if not missing:
+            return
+        loaded = self.batch_load(missing)
+        for key in missing:
+            self.values[key] = loaded.get(key, self.default)
+
+    def load(self, key):
+        self.prime([key])
+        return self.values[key]
+
+
+def get_loader(request, loader_class):
+    if request is None:
+        return loader_class(None)
+    loaders = getattr(request, '_loaders', None)
+    if loaders is None or loaders[0] is not request.user:
+        loaders = (request.user, {})
+        request._loaders = loaders
+    if loader_class not in loaders[1]:
+        loaders[1][loader_class] = loader_class(request)
+    return loaders[1][loader_class]
+
+
+class UserFlagLoader(Loader):
+    # Есть ли у текущего пользователя связь с объектом (подписка,
+    # избранное, покупки): ключ — id объекта, значение — bool.
+    default = False
+    model = None
+    field = None
+
+    def batch_load(self, keys):
+        if self.user is None or self.user.is_anonymous:
+            return {}
+        found = self.model.objects.filter(
+            user=self.user, **{self.field + '__in': keys}
+        ).values_list(self.field, flat=True)
+        return {key: True for key in found}
+
+
+class FollowLoader(UserFlagLoader):
+    model = Follow
+    field = 'author_id'
+
+    def prime(self, keys):
+        # На себя подписаться нельзя: такой id не запрашиваем.
+        if self.user is not None and self.user.pk is not None:
+            self.values.setdefault(self.user.pk, False)
+        super().prime(keys)
+
+
+class FavoriteLoader(UserFlagLoader):
+    model = Favorite
+    field = 'recipe_id'
+
+
+class ShoppingCartLoader(UserFlagLoader):
+    model = ShoppingCart
+    field = 'recipe_id'
+
+
+class LatestRecipesLoader(Loader):
+    # Последние recipes_limit рецептов каждого автора одним запросом.
+    default = ()
+
+    def batch_load(self, keys):
+        limit = get_recipes_limit(self.request)
+        if not limit:
+            return {}
+        recipes = Recipe.objects.filter(author_id__in=keys).filter(
+            pk__in=Subquery(Recipe.objects.filter(
+                author=OuterRef('author')
+            ).order_by('-pub_date').values('pk')[:limit])
+        ).order_by('author_id', '-pub_date')
+        loaded = {}
+        for recipe in recipes:
+            loaded.setdefault(recipe.author_id, []).append(recipe)
+        return loaded
+
+
+class BatchedField(serializers.Field):
+    """Поле, значение которого берётся из Loader.
+
+    Если у объекта уже есть атрибут с именем поля (аннотация или
+    prefetch), используется он. BatchedListSerializer перед выводом
+    страницы собирает ключи всех таких полей, включая вложенные
+    сериализаторы, и загружает их пачкой.
+    """
+
+    def __init__(self, loader_class, key='id', serializer_class=None,
+                 **kwargs):
+        self.loader_class = loader_class
+        self.key = key
+        self.serializer_class = serializer_class
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_loader(self):
+        return get_loader(self.context.get('request'), self.loader_class)
+
+    def get_key(self, instance):
+        return getattr(instance, self.key)
+
+    def prime(self, instances):
+        self.get_loader().prime(
+            self.get_key(instance) for instance in instances
+            if not hasattr(instance, self.field_name)
+        )
+
+    def to_representation(self, instance):
+        if hasattr(instance, self.field_name):
+            value = getattr(instance, self.field_name)
+        else:
+            value = self.get_loader().load(self.get_key(instance))
+        if self.serializer_class is not None:
+            return self.serializer_class(value, many=True,
+                                         context=self.context).data
+        return value
+
+
+def prime_batched(serializer, instances):
+    for field in serializer.fields.values():
+        if isinstance(field, BatchedField):
+            field.prime(instances)
+        elif isinstance(field, serializers.BaseSerializer) and not isinstance(
+                field, serializers.ListSerializer):
+            nested = []
+            for instance in instances:
+                try:
+                    nested.append(field.get_attribute(instance))
+                except (AttributeError, KeyError):
+                    pass
+            prime_batched(field, [item for item in nested if item is not None])
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        data = list(data.all() if hasattr(data, 'all') else data)
+        prime_batched(self.child, data)
+        return super().to_representation(data)
@@ -0,0 +1,84 @@
+import json
+import os
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.autocomplete import IngredientIndex, normalize  # isort:skip
+from api.cache import ingredients_catalog  # isort:skip
+from recipes.models import Ingredient  # isort:skip
+
+
+def latencies(func, queries):
+    result = []
+    for query in queries:
+        started = time.perf_counter()
+        func(query)
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p90/p99 подсказок ингредиентов: индекс в памяти '
+            'против istartswith/icontains в базе. Пустой справочник '
+            'заполняется из ingredients.json во временной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=os.path.join(
+            settings.BASE_DIR, 'ingredients.json'))
+        parser.add_argument('--queries', type=int, default=300)
+        parser.add_argument('--limit', type=int,
+                            default=settings.INGREDIENT_SEARCH_LIMIT)
+
+    def make_queries(self, names, total):
+        # Префиксы 1-6 символов и подстроки 3-6 символов из середины.
+        rng = random.Random(0)
+        prefixes, substrings = [], []
+        for _ in range(total):
+            name = normalize(rng.choice(names))
+            prefixes.append(name[:rng.randint(1, 6)])
+            size = min(len(name), rng.randint(3, 6))
+            start = rng.randint(0, len(name) - size)
+            substrings.append(name[start:start + size])
+        return prefixes, substrings
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        with transaction.atomic():
+            if not Ingredient.objects.exists():
+                with open(options['path'], encoding='utf-8') as f:
+                    Ingredient.objects.bulk_create(
+                        Ingredient(**row) for row in json.load(f))
+            names = list(Ingredient.objects.values_list('name', flat=True))
+            index = IngredientIndex(ingredients_catalog)
+            started = time.perf_counter()
+            index.build()
+            self.stdout.write('{} ингредиентов, индекс собран за {:.0f} мс'
+                              .format(len(names),
+                                      (time.perf_counter() - started) * 1000))
+            prefixes, substrings = self.make_queries(
+                names, options['queries'])
+            modes = (
+                ('префикс, индекс', prefixes,
+                 lambda query: index.search(query, limit)),
+                ('префикс, istartswith', prefixes,
+                 lambda query: list(Ingredient.objects.filter(
+                     name__istartswith=query).order_by('name')[:limit])),
+                ('подстрока, индекс', substrings,
+                 lambda query: index.search(query, limit)),
+                ('подстрока, icontains', substrings,
+                 lambda query: list(Ingredient.objects.filter(
+                     name__icontains=query).order_by('name')[:limit])),
+            )
+            for name, queries, search in modes:
+                search(queries[0])
+                cuts = statistics.quantiles(latencies(search, queries),
+                                            n=100)
+                self.stdout.write(
+                    '{}: p50 {:.2f} мс, p90 {:.2f} мс, p99 {:.2f} мс'.format(
+                        name, cuts[49], cuts[89], cuts[98]))
+            transaction.set_rollback(True)
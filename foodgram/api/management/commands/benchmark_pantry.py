@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import pantry  # isort:skip
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+class Command(BaseCommand):
+    help = ('Строит индекс «ингредиент -> рецепты» на синтетических данных '
+            'и замеряет подбор рецептов по набору продуктов с numpy и без '
+            'него. База данных не используется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=8)
+
+    def rows(self, recipes_total, ingredients_total):
+        rng = random.Random(0)
+        # Частота ингредиентов по закону Ципфа: соль и масло почти везде.
+        ingredients = range(1, ingredients_total + 1)
+        weights = [1 / pk for pk in ingredients]
+        for recipe_id in range(1, recipes_total + 1):
+            chosen = set(rng.choices(ingredients, weights,
+                                     k=rng.randint(4, 14)))
+            for ingredient_id in chosen:
+                yield recipe_id, ingredient_id
+
+    def handle(self, *args, **options):
+        index = pantry.PantryIndex()
+        started = time.perf_counter()
+        index.load(self.rows(options['recipes'], options['ingredients']))
+        size = sum(len(posting) * posting.itemsize
+                   for posting in index.postings.values())
+        self.stdout.write(
+            'Индекс: {} рецептов, {} связей, {} МБ, собран за {:.0f} с'.format(
+                options['recipes'], size // 4, size // 2 ** 20,
+                time.perf_counter() - started))
+        rng = random.Random(1)
+        limit = options['limit']
+        cases = (
+            ('5 редких', rng.sample(range(200, options['ingredients']), 5)),
+            ('15 смешанных', [1, 2, 3] + rng.sample(range(4, 500), 12)),
+            ('30 популярных', list(range(1, 31))),
+        )
+        modes = {'python': index.match_python}
+        if pantry.numpy is not None:
+            modes['numpy'] = index.match_numpy
+        for name, ingredient_ids in cases:
+            postings = [index.postings[pk] for pk in ingredient_ids
+                        if pk in index.postings]
+            results = {}
+            for mode, match in modes.items():
+                elapsed, results[mode] = timed(
+                    lambda: self.first_page(match(postings), limit),
+                    options['repeat'])
+                self.stdout.write('{}: {} рецептов, {} — {:.1f} мс'.format(
+                    name, results[mode][0], mode, elapsed))
+            if len(set(map(repr, results.values()))) > 1:
+                raise CommandError('{}: результаты различаются'.format(name))
+
+    def first_page(self, found, limit):
+        return len(found), found[:limit]
@@ -0,0 +1,82 @@
+import io
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import serialize_recipes  # isort:skip
+from api.parsers import FastJSONParser  # isort:skip
+from api.renderers import (FastJSONRenderer,  # isort:skip
+                           JSONStreamRenderer, orjson)  # isort:skip
+from api.serializers import IngredientSerializer  # isort:skip
+from recipes.models import Ingredient, Recipe  # isort:skip
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak // 1024
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стандартные JSONRenderer/JSONParser с '
+            'FastJSONRenderer/FastJSONParser на справочнике ингредиентов '
+            'и странице рецептов и проверяет, что вывод совпадает.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write('orjson: {}'.format(
+            orjson.__version__ if orjson else 'не установлен'))
+        ids = list(Recipe.objects.values_list('id', flat=True)[:100])
+        recipes = serialize_recipes(ids)
+        datasets = {
+            'ingredients': IngredientSerializer(
+                Ingredient.objects.all(), many=True).data,
+            'recipes': [recipes[pk][1] for pk in ids],
+        }
+        for name, data in datasets.items():
+            expected = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != expected:
+                raise CommandError('{}: вывод рендереров различается'.format(
+                    name))
+            streamed = b''.join(JSONStreamRenderer().render_items(data))
+            if streamed != expected:
+                raise CommandError('{}: потоковый вывод различается'.format(
+                    name))
+            stdlib = timed(lambda: JSONRenderer().render(data), repeat)
+            fast = timed(lambda: FastJSONRenderer().render(data), repeat)
+            self.stdout.write(
+                '{}: {} элементов, {} КБ; render {:.2f} мс -> {:.2f} мс '
+                '({:.1f}x)'.format(name, len(data), len(expected) // 1024,
+                                   stdlib, fast, stdlib / fast))
+            parsed = JSONParser().parse(io.BytesIO(expected))
+            if FastJSONParser().parse(io.BytesIO(expected)) != parsed:
+                raise CommandError('{}: результат парсеров различается'
+                                   .format(name))
+            stdlib = timed(lambda: JSONParser().parse(io.BytesIO(expected)),
+                           repeat)
+            fast = timed(
+                lambda: FastJSONParser().parse(io.BytesIO(expected)), repeat)
+            self.stdout.write('{}: parse {:.2f} мс -> {:.2f} мс ({:.1f}x)'
+                              .format(name, stdlib, fast, stdlib / fast))
+            whole = peak_memory(lambda: JSONRenderer().render(data))
+            chunked = peak_memory(lambda: sum(
+                len(chunk) for chunk in
+                JSONStreamRenderer().render_items(iter(data))))
+            self.stdout.write(
+                '{}: пик памяти при выводе {} КБ целиком, {} КБ потоком'
+                .format(name, whole, chunked))
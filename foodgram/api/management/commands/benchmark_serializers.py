@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from .check_query_plans import Command as QueryPlansCommand
+
+from api.fast_serializers import serialize_recipes  # isort:skip
+from api.fragments import recipe_fragments  # isort:skip
+from recipes.models import Recipe  # isort:skip
+
+
+def render(built, ids):
+    return JSONRenderer().render([built[pk][1] for pk in ids])
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость сборки рецептов из .values() и через '
+            'RecipeGetSerializer на странице рецептов. Совпадение ответов '
+            'проверяют тесты (tests/test_fast_serializers.py). Недостающие '
+            'рецепты создаются во временной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, build, ids, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            render(build(ids), ids)
+        return (time.perf_counter() - started) * 1000 / repeat
+
+    def handle(self, *args, **options):
+        size, repeat = options['size'], options['repeat']
+        with transaction.atomic():
+            missing = size - Recipe.objects.count()
+            if missing > 0:
+                QueryPlansCommand().seed(missing, 10)
+            ids = list(Recipe.objects.values_list('id', flat=True)[:size])
+            slow_ms = self.measure(
+                lambda ids: recipe_fragments.serialize(ids, {}), ids, repeat)
+            fast_ms = self.measure(serialize_recipes, ids, repeat)
+            transaction.set_rollback(True)
+        self.stdout.write(
+            '{} рецептов. RecipeGetSerializer: {:.1f} мс, .values(): '
+            '{:.1f} мс, ускорение {:.1f}x'.format(
+                len(ids), slow_ms, fast_ms, slow_ms / fast_ms))
@@ -0,0 +1,62 @@
+import random
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import pantry, similar  # isort:skip
+from api.management.commands import benchmark_pantry  # isort:skip
+
+
+class Command(BaseCommand):
+    help = ('Считает похожие рецепты на синтетических данных без записи в '
+            'базу: время и память полного прохода с SciPy и сверка с '
+            'расчётом без него на выборке рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--max-df', type=int, default=10000)
+        parser.add_argument('--sample', type=int, default=20)
+        parser.add_argument('--full', action='store_true',
+                            help='Посчитать соседей всех рецептов, а не '
+                                 'первых 100 блоков')
+
+    def handle(self, *args, **options):
+        if similar.sparse is None or pantry.numpy is None:
+            raise CommandError('Нужны numpy и scipy')
+        index = pantry.PantryIndex()
+        index.load(benchmark_pantry.Command().rows(
+            options['recipes'], options['ingredients']))
+        started = time.perf_counter()
+        vectors = similar.IngredientVectors.from_index(index,
+                                                       options['max_df'])
+        self.stdout.write('Матрица {}x{}, {} ненулевых, {:.1f} с'.format(
+            *vectors.matrix.shape, vectors.matrix.nnz,
+            time.perf_counter() - started))
+        k, size = options['top_k'], options['chunk_size']
+        ids = vectors.ids if options['full'] else vectors.ids[:100 * size]
+        started = time.perf_counter()
+        for start in range(0, len(ids), size):
+            vectors.neighbours(ids[start:start + size], k)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            '{} рецептов за {:.1f} с ({:.2f} мс на рецепт), '
+            'пик памяти {} МБ'.format(
+                len(ids), elapsed, elapsed * 1000 / max(len(ids), 1),
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+        sample = random.Random(2).sample(ids, min(options['sample'],
+                                                  len(ids)))
+        expected = vectors.neighbours(sample, k)
+        vectors.build_lists()
+        started = time.perf_counter()
+        found = vectors.neighbours(sample, k)
+        self.stdout.write('Без SciPy: {:.0f} мс на рецепт'.format(
+            (time.perf_counter() - started) * 1000 / max(len(sample), 1)))
+        for pk in sample:
+            # Порядок равных по сходству соседей зависит от округления.
+            if not pantry.numpy.allclose([s for _, s in found[pk]],
+                                         [s for _, s in expected[pk]]):
+                raise CommandError('Рецепт {}: соседи различаются'.format(pk))
@@ -0,0 +1,113 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Recipe, Tag  # isort:skip
+from users.models import User  # isort:skip
+
+PREFIX = 'tag_bench_'
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+def by_join(slugs, match_all):
+    queryset = Recipe.objects.all()
+    if match_all:
+        for slug in slugs:
+            queryset = queryset.filter(tags__slug=slug)
+    else:
+        queryset = queryset.filter(tags__slug__in=slugs)
+    return queryset.distinct()
+
+
+def by_mask(slugs, match_all):
+    mask = sum(tag.mask for tag in Tag.objects.filter(slug__in=slugs))
+    if match_all:
+        return Recipe.objects.filter(tags_mask__bitall=mask)
+    return Recipe.objects.filter(tags_mask__bitany=mask)
+
+
+def page(queryset):
+    return (queryset.count(),
+            list(queryset.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True)[:8]))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтр рецептов по тэгам через JOIN с DISTINCT и '
+            'через Recipe.tags_mask. Данные создаются во временной '
+            'транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def seed(self, recipes_total, tags_total, batch_size):
+        tags = [Tag.objects.create(name='{}{}'.format(PREFIX, i),
+                                   slug='{}{}'.format(PREFIX, i))
+                for i in range(tags_total)]
+        if any(tag.bit is None for tag in tags):
+            raise CommandError('Для тэгов не хватило битов маски')
+        author = User.objects.create(username=PREFIX,
+                                     email=PREFIX + '@example.org')
+        rng = random.Random(0)
+        # Популярность тэгов неравномерна: первые встречаются чаще.
+        weights = [1 / (i + 1) for i in range(tags_total)]
+        through = Recipe.tags.through
+        for start in range(0, recipes_total, batch_size):
+            size = min(batch_size, recipes_total - start)
+            chosen = [set(rng.choices(tags, weights, k=rng.randint(1, 3)))
+                      for _ in range(size)]
+            Recipe.objects.bulk_create(
+                Recipe(name='{}{}'.format(PREFIX, start + i), author=author,
+                       text=PREFIX, cooking_time=1, image='tag_bench.png',
+                       tags_mask=sum(tag.mask for tag in tag_set))
+                for i, tag_set in enumerate(chosen)
+            )
+            ids = Recipe.objects.filter(author=author).order_by(
+                '-id').values_list('id', flat=True)[:size]
+            through.objects.bulk_create(
+                through(recipe_id=recipe_id, tag_id=tag.id)
+                for recipe_id, tag_set in zip(reversed(ids), chosen)
+                for tag in tag_set
+            )
+        return [tag.slug for tag in tags]
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with transaction.atomic():
+            started = time.perf_counter()
+            slugs = self.seed(options['recipes'], options['tags'],
+                              options['batch_size'])
+            self.stdout.write('Создано {} рецептов и {} тэгов за {:.0f} с'
+                              .format(options['recipes'], options['tags'],
+                                      time.perf_counter() - started))
+            cases = (
+                ('1 тэг', slugs[:1], False),
+                ('2 редких тэга, любой', slugs[-2:], False),
+                ('3 тэга, любой', slugs[:3], False),
+                ('2 тэга, все', slugs[:2], True),
+                ('3 тэга, все', slugs[:3], True),
+            )
+            for name, case_slugs, match_all in cases:
+                join_ms, expected = timed(
+                    lambda: page(by_join(case_slugs, match_all)), repeat)
+                mask_ms, actual = timed(
+                    lambda: page(by_mask(case_slugs, match_all)), repeat)
+                if actual != expected:
+                    raise CommandError('{}: результаты различаются: {} и {}'
+                                       .format(name, expected, actual))
+                self.stdout.write(
+                    '{}: {} рецептов; JOIN {:.1f} мс, маска {:.1f} мс '
+                    '({:.1f}x)'.format(name, expected[0], join_ms, mask_ms,
+                                       join_ms / mask_ms))
+            transaction.set_rollback(True)
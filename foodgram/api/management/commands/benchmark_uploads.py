@@ -0,0 +1,114 @@
+import base64
+import io
+import json
+import os
+import resource
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .check_query_plans import Command as QueryPlansCommand
+
+from api.images import variant_builder  # isort:skip
+from api.views import RecipeViewSet  # isort:skip
+from recipes.models import Ingredient  # isort:skip
+
+
+def make_jpeg(width, height):
+    # Шум плохо сжимается, так что файл получается близким к реальному фото.
+    image = Image.frombytes('RGB', (width, height),
+                            os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def build_request(mode, payload, tag, ingredient):
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    fields = {'name': 'benchmark', 'text': 'benchmark', 'cooking_time': 1}
+    ingredients = [{'id': ingredient.id, 'amount': 1}]
+    if mode == 'json':
+        fields.update(
+            image='data:image/jpeg;base64,' + base64.b64encode(
+                payload).decode(),
+            tags=[tag.id], ingredients=ingredients
+        )
+        return factory.post('/api/recipes/', json.dumps(fields),
+                            content_type='application/json')
+    image = io.BytesIO(payload)
+    image.name = 'benchmark.jpg'
+    fields.update(image=image, tags=[tag.id],
+                  ingredients=json.dumps(ingredients))
+    return factory.post('/api/recipes/', fields, format='multipart')
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пиковое потребление памяти при создании рецепта '
+            'с картинкой в base64 внутри JSON и частью multipart. Каждый '
+            'замер выполняется в отдельном процессе, данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=1600)
+        parser.add_argument('--height', type=int, default=1200)
+
+    def measure(self, mode, payload):
+        # ru_maxrss только растёт, поэтому каждый режим — в своём процессе.
+        read_fd, write_fd = os.pipe()
+        connections.close_all()
+        pid = os.fork()
+        if pid:
+            os.close(write_fd)
+            with os.fdopen(read_fd) as f:
+                result = json.loads(f.read() or 'null')
+            os.waitpid(pid, 0)
+            if result is None:
+                raise CommandError('Замер {} не удался'.format(mode))
+            return result
+        os.close(read_fd)
+        # Варианты картинки строятся фоновым потоком вне запроса и в замер
+        # попадать не должны.
+        variant_builder.schedule = lambda name: None
+        result = None
+        try:
+            with transaction.atomic():
+                user, _, tag, _ = QueryPlansCommand().seed(1, 2)
+                request = build_request(mode, payload, tag,
+                                        Ingredient.objects.first())
+                force_authenticate(request, user)
+                view = RecipeViewSet.as_view({'post': 'create'})
+                baseline = max_rss()
+                tracemalloc.start()
+                response = view(request)
+                response.render()
+                python_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                result = {'status': response.status_code,
+                          'content': response.content.decode(),
+                          'rss': max_rss() - baseline,
+                          'python': python_peak // 1024}
+                transaction.set_rollback(True)
+        finally:
+            with os.fdopen(write_fd, 'w') as f:
+                f.write(json.dumps(result))
+            os._exit(0)
+
+    def handle(self, *args, **options):
+        payload = make_jpeg(options['width'], options['height'])
+        self.stdout.write('Картинка {}x{}, {} КБ (base64 {} КБ)'.format(
+            options['width'], options['height'], len(payload) // 1024,
+            len(payload) * 4 // 3 // 1024))
+        for mode in ('json', 'multipart'):
+            result = self.measure(mode, payload)
+            if result['status'] != 201:
+                raise CommandError('{}: ответ {} {}'.format(
+                    mode, result['status'], result['content']))
+            self.stdout.write(
+                '{:<10} пик RSS +{} КБ, пик Python-аллокаций {} КБ'.format(
+                    mode, result['rss'], result['python']))
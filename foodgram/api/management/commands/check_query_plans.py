@@ -0,0 +1,160 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.trending import refresh_popularity  # isort:skip
+from recipes.models import (Favorite, Ingredient,  # isort:skip
+                            IngredientInRecipe, Recipe,  # isort:skip
+                            ShoppingCart, Tag)  # isort:skip
+from users.models import Follow, User  # isort:skip
+
+# Для каждого адреса — таблицы, которые допустимо читать целиком. Каждое
+# исключение объяснено рядом с адресом; остальные адреса обязаны
+# обходиться индексами.
+ENDPOINTS = (
+    # COUNT(*) для пагинации без фильтров проходит по всей таблице
+    # рецептов; сама страница читается по recipe_pub_date_idx.
+    ('/api/recipes/', ('recipes_recipe',)),
+    ('/api/recipes/?is_favorited=1', ()),
+    ('/api/recipes/?is_in_shopping_cart=1', ()),
+    ('/api/recipes/?author={author}', ()),
+    # Осознанный компромисс: битовая маска не индексируется, зато нет
+    # JOIN с recipes_recipe_tags и DISTINCT. Что фильтр не откатился на
+    # JOIN, проверяет tests/test_tag_filter.py. recipes_tag читается
+    # целиком при смене версии справочника тэгов (биты тэгов по slug).
+    ('/api/recipes/?tags={tag}', ('recipes_recipe', 'recipes_tag')),
+    # Тот же COUNT(*), что и без сортировки; страница идёт по
+    # recipe_popular_idx.
+    ('/api/recipes/?ordering=popular', ('recipes_recipe',)),
+    # Тот же COUNT(*). Страница сортируется по оценке из LEFT JOIN с
+    # recipes_recipepopularity, и рецепты без оценки идут после всех:
+    # такой порядок индексом рецептов не покрыть, поэтому выборка тоже
+    # проходит все рецепты. Дешёвый путь — /api/recipes/trending/ ниже.
+    ('/api/recipes/?ordering=trending', ('recipes_recipe',)),
+    ('/api/recipes/trending/', ()),
+    # Без PostgreSQL первый поиск собирает обратный индекс в памяти из
+    # всех рецептов и их тэгов; дальше читаются только изменённые.
+    ('/api/recipes/?search=plan_check',
+     ('recipes_recipe', 'recipes_recipe_tags')),
+    ('/api/recipes/?cursor=', ()),
+    ('/api/recipes/{recipe}/', ()),
+    ('/api/recipes/feed/', ()),
+    ('/api/recipes/download_shopping_cart/', ()),
+    # COUNT(*) для пагинации; страница без ORDER BY читает таблицу
+    # подряд, но останавливается на LIMIT.
+    ('/api/users/', ('users_user',)),
+    ('/api/users/subscriptions/?recipes_limit=3', ()),
+)
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы основных эндпоинтов на тестовом наборе '
+            'данных и проверяет через EXPLAIN, что ни один из них не '
+            'читает таблицы последовательным сканированием.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--users', type=int, default=20)
+
+    def seed(self, recipes_total, users_total):
+        User.objects.bulk_create(
+            User(username='plan_check_{}'.format(i),
+                 email='plan_check_{}@example.org'.format(i))
+            for i in range(users_total)
+        )
+        users = list(User.objects.filter(username__startswith='plan_check_'))
+        tags = [Tag.objects.create(name='plan_check_{}'.format(i),
+                                   slug='plan_check_{}'.format(i))
+                for i in range(3)]
+        Ingredient.objects.bulk_create(
+            Ingredient(name='plan_check_{}'.format(i), measurement_unit='г')
+            for i in range(50)
+        )
+        ingredients = list(Ingredient.objects.filter(
+            name__startswith='plan_check_'))
+        for i in range(recipes_total):
+            recipe = Recipe.objects.create(
+                name='plan_check_{}'.format(i), author=users[i % len(users)],
+                text='plan_check', cooking_time=1, image='plan_check.png'
+            )
+            recipe.tags.add(tags[i % len(tags)])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredients=ingredient,
+                                   amount=1)
+                for ingredient in ingredients[i % 40:i % 40 + 5]
+            )
+            if i % 3 == 0:
+                Favorite.objects.create(user=users[0], recipe=recipe)
+                ShoppingCart.objects.create(user=users[0], recipe=recipe)
+        for author in users[1:]:
+            Follow.objects.create(user=users[0], author=author)
+        refresh_popularity()
+        return users[0], users[1], tags[0], recipe
+
+    def capture(self, client, urls):
+        queries = []
+        for url, allowed in urls:
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            if response.status_code != 200:
+                raise CommandError('{} вернул {}'.format(
+                    url, response.status_code))
+            queries += [(url, allowed, query['sql'])
+                        for query in captured.captured_queries
+                        if query['sql'].lstrip().upper().startswith('SELECT')]
+        return queries
+
+    def sequential_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN ' + sql)
+                return re.findall(r'Seq Scan on (\w+)',
+                                  '\n'.join(row[0] for row in cursor))
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return [match.group(1) for match in (
+                    SQLITE_SCAN.match(row[-1]) for row in cursor) if match]
+        raise CommandError('Поддерживаются только PostgreSQL и SQLite')
+
+    def handle(self, *args, **options):
+        failures = []
+        checked = set()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На небольшом наборе данных планировщик и так выберет
+                # seq scan; запрет показывает, есть ли подходящий индекс.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            user, author, tag, recipe = self.seed(options['recipes'],
+                                                  options['users'])
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            urls = [(url.format(author=author.id, tag=tag.slug,
+                                recipe=recipe.id), allowed)
+                    for url, allowed in ENDPOINTS]
+            tables = set(connection.introspection.table_names())
+            for url, allowed, sql in self.capture(client, urls):
+                if sql in checked:
+                    continue
+                checked.add(sql)
+                for table in self.sequential_scans(sql):
+                    # Подзапросы во FROM тоже видны в плане как SCAN.
+                    if table in tables and table not in allowed:
+                        failures.append((url, table, sql))
+            # Тестовые данные не сохраняются.
+            transaction.set_rollback(True)
+        for url, table, sql in failures:
+            self.stderr.write('{}: seq scan по {}\n    {}'.format(
+                url, table, sql))
+        if failures:
+            raise CommandError('Найдено последовательных сканирований: {}'
+                               .format(len(failures)))
+        self.stdout.write(self.style.SUCCESS(
+            'Проверено запросов: {}, последовательных сканирований нет'
+            .format(len(checked))))
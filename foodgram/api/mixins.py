@@ -1,8 +1,20 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import mixins, status, viewsets
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics, mixins, status, viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .cache import get_versions
+from .counters import change_counter
+from .fragments import recipe_fragments
+from .renderers import JSONStreamRenderer
+
 from recipes.models import Recipe  # isort:skip
 
 
@@ -21,6 +33,149 @@ class ListOneMixin(mixins.ListModelMixin,
     pass
 
 
+class StreamListMixin:
+
+    def stream_list(self, items):
+        if isinstance(items, QuerySet):
+            items = items.iterator()
+        serializer = self.get_serializer()
+        return StreamingHttpResponse(
+            JSONStreamRenderer().render_items(
+                serializer.to_representation(item) for item in items),
+            content_type=JSONStreamRenderer.media_type
+        )
+
+
+class CatalogListMixin(StreamListMixin):
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return self.stream_list(self.filter_queryset(self.get_queryset()))
+        version, content = self.catalog.get()
+        etag = quote_etag('{}-{}'.format(self.catalog.name, version))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(version)
+        )
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        return response
+
+
+class ConditionalRecipeMixin:
+    # ETag и Last-Modified собираются из версий в кэше, от которых зависит
+    # ответ: рецепты, справочники, профили авторов, избранное/покупки/
+    # подписки текущего пользователя и порядок выдачи, плюс полный URL
+    # с фильтрами. Карточке рецепта хватает его updated_at по первичному
+    # ключу. По выборке ничего не агрегируется, на совпадение отвечаем
+    # 304 без сериализации.
+    ordering_versions = {'popular': 'popularity', 'trending': 'trending'}
+
+    def get_version_names(self):
+        # images: ответ, собранный до готовности вариантов, ссылается
+        # на оригинал картинки.
+        names = ['tags', 'ingredients', 'authors', 'images']
+        user_id = self.request.user.id
+        if user_id is not None:
+            names += ['{}:{}'.format(name, user_id) for name in
+                      ('favorites', 'shopping_cart', 'follows')]
+        return names
+
+    def get_validators(self, names, updated=None):
+        versions = get_versions(names)
+        versions = [versions[name] for name in names]
+        raw = '{}|{}|{}|{}'.format(
+            self.request.get_full_path(), self.request.user.id,
+            updated and updated.isoformat(), versions
+        )
+        etag = 'W/"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+        if updated is not None:
+            versions.append(updated.timestamp())
+        return etag, max(versions)
+
+    def conditional(self, respond, names, updated=None):
+        etag, last_modified = self.get_validators(names, updated)
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = respond()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        names = ['recipes'] + self.get_version_names()
+        ordering = self.ordering_versions.get(
+            request.query_params.get('ordering'))
+        if ordering is not None:
+            names.append(ordering)
+        return self.conditional(
+            lambda: super(ConditionalRecipeMixin, self).list(
+                request, *args, **kwargs),
+            names
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        updated = Recipe.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True).first()
+        if updated is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(
+            lambda: super(ConditionalRecipeMixin, self).retrieve(
+                request, *args, **kwargs),
+            self.get_version_names(), updated
+        )
+
+
+class RecipeFragmentMixin:
+    # Список и карточка рецепта собираются из кэша фрагментов: запрос
+    # к БД выбирает только id страницы и флаги текущего пользователя.
+
+    def get_fragment_queryset(self):
+        return recipe_fragments.light_queryset(self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_fragment_queryset())
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        if page is None:
+            return Response(recipe_fragments.render(list(queryset), context))
+        return self.get_paginated_response(
+            recipe_fragments.render(page, context))
+
+    def render_ranked(self, rows, extra):
+        # rows — кортежи (id рецепта, ...) в порядке выдачи; к фрагменту
+        # каждого найденного рецепта добавляются поля extra(*остальное).
+        # Удалённые рецепты пропускаются.
+        recipes = self.get_fragment_queryset().in_bulk(
+            [row[0] for row in rows])
+        data = {item['id']: item for item in recipe_fragments.render(
+            [recipes[row[0]] for row in rows if row[0] in recipes],
+            self.get_serializer_context()
+        )}
+        return [dict(data[pk], **extra(*values))
+                for pk, *values in rows if pk in data]
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = generics.get_object_or_404(
+            self.get_fragment_queryset(),
+            pk=kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        self.check_object_permissions(request, recipe)
+        data = recipe_fragments.render([recipe],
+                                       self.get_serializer_context())
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+
 class CreateDestroyMixin(mixins.CreateModelMixin,
                          mixins.DestroyModelMixin,
                          viewsets.GenericViewSet):
@@ -30,6 +185,7 @@ class CreateDestroyMixin(mixins.CreateModelMixin,
 class CustomShoppingFavoriteMixin(CreateDestroyMixin):
     permission_classes = (IsAuthenticated,)
     lookup_field = 'recipe_id'
+    counter_field = None
 
     def get_queryset(self):
         recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
@@ -37,11 +193,15 @@ class CustomShoppingFavoriteMixin(CreateDestroyMixin):
 
     def perform_create(self, serializer):
         recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
-        serializer.save(user=self.request.user, recipe=recipe)
+        with transaction.atomic():
+            serializer.save(user=self.request.user, recipe=recipe)
+            change_counter(Recipe, recipe.pk, self.counter_field, 1)
 
     def destroy(self, request, *args, **kwargs):
         recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
         user = self.request.user
         instance = get_object_or_404(self.model, recipe=recipe, user=user)
-        self.perform_destroy(instance)
+        with transaction.atomic():
+            self.perform_destroy(instance)
+            change_counter(Recipe, recipe.pk, self.counter_field, -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,196 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class PaginatorLimit(PageNumberPagination):
     page_size = 8
     page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return settings.RECIPES_LIMIT_MAX
+    return max(0, min(limit, settings.RECIPES_LIMIT_MAX))
+
+
+def get_similar_limit(request):
+    try:
+        limit = int(request.query_params['limit'])
+    except (KeyError, ValueError):
+        return PaginatorLimit.page_size
+    return max(0, min(limit, settings.SIMILAR_RECIPES_TOP_K))
+
+
+def keyset_filter(queryset, fields, position):
+    # Строки строго после position при сортировке по убыванию всех полей:
+    # (a < a0) OR (a = a0 AND b < b0) OR ...
+    if position is None:
+        return queryset
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{field + '__lt': position[i]})
+        for prev_field, value in zip(fields[:i], position):
+            step &= Q(**{prev_field: value})
+        condition |= step
+    return queryset.filter(condition)
+
+
+def estimate_count(queryset):
+    # Оценка по статистике планировщика PostgreSQL: reltuples для всей
+    # таблицы, либо число строк из плана EXPLAIN для запроса с фильтрами.
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    page_size = 8
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    fields = ('pub_date', 'id')
+    # Остальные поля курсора — целые числа.
+    datetime_fields = ('pub_date',)
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+                self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return [self.decode_value(field, value)
+                for field, value in zip(self.fields, position)]
+
+    def decode_value(self, field, value):
+        if field not in self.datetime_fields:
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+        elif isinstance(value, str):
+            try:
+                parsed = parse_datetime(value)
+            except ValueError:
+                parsed = None
+            if parsed is not None and parsed.tzinfo is not None:
+                return parsed
+        raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        # Даты — с микросекундами: DjangoJSONEncoder округляет их до
+        # миллисекунд, и строки той же миллисекунды после границы
+        # страницы пропадали бы.
+        data = json.dumps([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in position
+        ])
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def get_position(self, item):
+        return tuple(getattr(item, field) for field in self.fields)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approx':
+            return estimate_count(queryset)
+        return None
+
+    def fetch(self, queryset, position, size):
+        ordering = ['-' + field for field in self.fields]
+        queryset = keyset_filter(queryset.order_by(*ordering),
+                                 self.fields, position)
+        return list(queryset[:size])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = self.get_count(queryset, request)
+        size = self.get_page_size(request)
+        items = self.fetch(queryset, self.decode_cursor(request), size + 1)
+        self.next_position = None
+        if len(items) > size:
+            items = items[:size]
+            self.next_position = self.get_position(items[-1])
+        return items
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+
+class PaginatorLimitCursor(PaginatorLimit):
+    # По умолчанию постраничная пагинация, как ждёт фронтенд;
+    # с параметром cursor (в том числе пустым) — keyset-пагинация.
+    cursor_class = KeysetPagination
+    invalid_ordering_message = ('Курсор нельзя сочетать с сортировкой '
+                                'ordering или поиском.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_class.cursor_query_param not in request.query_params:
+            self.cursor = None
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor = self.cursor_class()
+        self.cursor.fields = getattr(view, 'keyset_fields',
+                                     self.cursor.fields)
+        # Курсор задаёт свой порядок и молча перебил бы ordering=popular,
+        # trending или сортировку поиска по релевантности.
+        ordering = list(queryset.query.order_by)
+        if ordering and ordering != [
+                '-' + field for field in self.cursor.fields]:
+            raise ValidationError({
+                self.cursor_class.cursor_query_param: [
+                    self.invalid_ordering_message]})
+        return self.cursor.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is None:
+            return super().get_paginated_response(data)
+        return self.cursor.get_paginated_response(data)
@@ -0,0 +1,171 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+from .cache import ingredients_catalog
+from .indexes import RecipeIndex
+
+from recipes.models import IngredientInRecipe  # isort:skip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# На коротких списках Counter быстрее, чем bincount по всем id.
+NUMPY_MIN_POSTINGS = 20000
+
+
+def grow(sizes, size):
+    if len(sizes) < size:
+        sizes.frombytes(bytes(sizes.itemsize * (size - len(sizes))))
+
+
+class PantryMatches:
+    """Рецепты, найденные по набору ингредиентов.
+
+    Ведёт себя как последовательность для Paginator: len() — число
+    рецептов хотя бы с одним ингредиентом из набора, срез — пары
+    (id, совпало, всего ингредиентов) по убыванию доли совпадений, затем
+    по числу недостающих и от новых рецептов к старым.
+    """
+
+    def __init__(self, ids, matched, totals):
+        self.ids = ids
+        self.matched = matched
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        if start >= stop:
+            return []
+        if numpy is not None and isinstance(self.ids, numpy.ndarray):
+            top = self.top_numpy(stop)
+        else:
+            top = heapq.nsmallest(stop, range(len(self.ids)), key=self.key)
+        return [(int(self.ids[i]), int(self.matched[i]), int(self.totals[i]))
+                for i in top[start:stop]]
+
+    def key(self, i):
+        return (-self.matched[i] / self.totals[i],
+                self.totals[i] - self.matched[i], -self.ids[i])
+
+    def top_numpy(self, count):
+        ratio = self.matched / self.totals
+        if count < len(ratio):
+            # Порог по доле совпадений отсекает почти все строки; равные
+            # порогу остаются и упорядочиваются ниже по остальным ключам.
+            threshold = numpy.partition(ratio, len(ratio) - count)[
+                len(ratio) - count]
+            rows = numpy.flatnonzero(ratio >= threshold)
+        else:
+            rows = numpy.arange(len(ratio))
+        order = numpy.lexsort((
+            -self.ids[rows].astype(numpy.int64),
+            self.totals[rows] - self.matched[rows],
+            -ratio[rows],
+        ))
+        return rows[order[:count]].tolist()
+
+
+class PantryIndex(RecipeIndex):
+    """Обратный индекс «ингредиент -> отсортированные id рецептов».
+
+    Списки рецептов хранятся как array('i'), рядом — число ингредиентов
+    каждого рецепта по его id. С numpy совпадения считаются векторно,
+    без него — через Counter.
+    """
+
+    catalogs = (ingredients_catalog.name,)
+
+    def __init__(self):
+        super().__init__()
+        self.postings = {}
+        self.sizes = array('H')
+
+    def load(self, rows):
+        # rows — пары (id рецепта, id ингредиента), упорядоченные по рецепту.
+        postings = {}
+        sizes = array('H')
+        for recipe_id, ingredient_id in rows:
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array('i')
+            posting.append(recipe_id)
+            if recipe_id >= len(sizes):
+                grow(sizes, max(recipe_id + 1, len(sizes) * 2))
+            sizes[recipe_id] += 1
+        self.postings = postings
+        self.sizes = sizes
+
+    def load_all(self):
+        self.load(IngredientInRecipe.objects.order_by(
+            'recipe_id').values_list('recipe_id', 'ingredients_id').iterator())
+
+    def reload(self, recipe_ids):
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+                recipe_id__in=ingredients).values_list('recipe_id',
+                                                       'ingredients_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, ingredient_ids in ingredients.items():
+            self.set_recipe(recipe_id, ingredient_ids)
+        return ingredients
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id, posting in self.postings.items():
+            i = bisect_left(posting, recipe_id)
+            present = i < len(posting) and posting[i] == recipe_id
+            if present and ingredient_id not in ingredient_ids:
+                del posting[i]
+            elif not present and ingredient_id in ingredient_ids:
+                posting.insert(i, recipe_id)
+        for ingredient_id in ingredient_ids - self.postings.keys():
+            self.postings[ingredient_id] = array('i', [recipe_id])
+        grow(self.sizes, recipe_id + 1)
+        self.sizes[recipe_id] = len(ingredient_ids)
+
+    def forget(self, recipe_ids):
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self.set_recipe(recipe_id, set())
+
+    def match(self, ingredient_ids):
+        self.ensure_current()
+        with self.lock:
+            postings = [self.postings[pk] for pk in set(ingredient_ids)
+                        if pk in self.postings]
+            if (numpy is None or sum(map(len, postings))
+                    < NUMPY_MIN_POSTINGS):
+                return self.match_python(postings)
+            return self.match_numpy(postings)
+
+    def match_python(self, postings):
+        counts = Counter(chain.from_iterable(postings))
+        ids = [pk for pk in counts if self.sizes[pk]]
+        return PantryMatches(ids, [counts[pk] for pk in ids],
+                             [self.sizes[pk] for pk in ids])
+
+    def match_numpy(self, postings):
+        if not postings:
+            return PantryMatches([], [], [])
+        counts = numpy.bincount(numpy.concatenate([
+            numpy.frombuffer(posting, dtype=numpy.intc)
+            for posting in postings
+        ]))
+        ids = numpy.flatnonzero(counts)
+        totals = numpy.frombuffer(self.sizes, dtype=numpy.uint16)[ids]
+        present = totals > 0
+        ids = ids[present]
+        return PantryMatches(ids, counts[ids].astype(numpy.int32),
+                             totals[present].astype(numpy.int32))
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, JSONParser, MultiPartParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding',
+                                              settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    # Картинка приходит отдельной частью и пишется на диск потоком
+    # (крупнее FILE_UPLOAD_MAX_MEMORY_SIZE — во временный файл), без base64.
+    # Поля приводятся к тому же виду, что и в JSON: tags — список,
+    # ingredients — JSON-строка со списком объектов.
+    list_fields = ('tags',)
+    json_fields = ('ingredients',)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key in parsed.data:
+            if key in self.list_fields:
+                data[key] = parsed.data.getlist(key)
+            elif key in self.json_fields:
+                try:
+                    data[key] = json.loads(parsed.data[key])
+                except ValueError as exc:
+                    raise ParseError('Поле {}: некорректный JSON - {}'.format(
+                        key, exc))
+            else:
+                data[key] = parsed.data[key]
+        # Request.data объединяет data и files через dict.update, поэтому
+        # файлы тоже отдаются обычным словарём, а не MultiValueDict.
+        return DataAndFiles(data, parsed.files.dict())
@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def orjson_default(obj):
+    # Всё, что orjson не знает или кодирует иначе (Decimal, ленивые
+    # строки перевода, datetime с «Z» вместо +00:00), — как в DRF.
+    return JSONEncoder().default(obj)
+
+
+def dumps(data):
+    if orjson is not None:
+        try:
+            content = orjson.dumps(data, default=orjson_default,
+                                   option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            # Как и JSONRenderer, экранируем U+2028/U+2029.
+            return content.replace(
+                b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029')
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Тот же вывод, что у JSONRenderer, но через orjson, если он
+    # установлен. Форматирование с отступами оставлено стандартному.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return dumps(data)
+
+
+class JSONStreamRenderer(FastJSONRenderer):
+    # Для больших списков без пагинации: элементы кодируются по одному
+    # и отдаются кусками, весь ответ целиком в памяти не собирается.
+    chunk_size = 64 * 1024
+
+    def render_items(self, items):
+        buffer = bytearray(b'[')
+        separator = b''
+        for item in items:
+            buffer += separator + dumps(item)
+            separator = b','
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += b']'
+        yield bytes(buffer)
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Используется только для ответов об ошибках (401 и т.п.).
+        return JSONRenderer().render(data)
+
+    def render_rows(self, rows):
+        raise NotImplementedError
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render_rows(self, rows):
+        for name, measurement_unit, amount in rows:
+            yield '{} ({}) - {}\n'.format(name, measurement_unit, amount)
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render_rows(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render_rows(self, rows):
+        separator = '['
+        for name, measurement_unit, amount in rows:
+            yield separator + json.dumps(
+                {'name': name,
+                 'measurement_unit': measurement_unit,
+                 'amount': amount},
+                ensure_ascii=False
+            )
+            separator = ',\n'
+        yield ']' if separator == ',\n' else '[]'
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        path = settings.SHOPPING_CART_PDF_FONT
+        if not os.path.exists(path):
+            return 'Helvetica'
+        if 'ShoppingCartFont' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('ShoppingCartFont', path))
+        return 'ShoppingCartFont'
+
+    def render_rows(self, rows):
+        # PDF нельзя отдавать по частям: таблица ссылок (xref) пишется
+        # в конце файла, поэтому документ собирается целиком.
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        margin = 50
+        y = height - margin
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(margin, y, 'Список покупок')
+        y -= self.font_size * 2
+        pdf.setFont(font, self.font_size)
+        for name, measurement_unit, amount in rows:
+            if y < margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - margin
+            pdf.drawString(margin, y, '{} ({}) - {}'.format(
+                name, measurement_unit, amount))
+            y -= self.font_size * 1.5
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = (
+    ShoppingCartTextRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartJSONRenderer,
+    ShoppingCartPDFRenderer,
+)
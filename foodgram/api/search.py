@@ -0,0 +1,173 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Value, When
+
+from .autocomplete import normalize
+from .cache import ingredients_catalog, tags_catalog
+from .indexes import RecipeIndex
+
+from recipes.models import IngredientInRecipe, Recipe  # isort:skip
+
+CONFIG = 'russian'
+# Веса частей рецепта — как у ts_rank по умолчанию для A, B, C, D.
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+# Без PostgreSQL ранжированная выдача передаётся в запрос списком id.
+FALLBACK_LIMIT = 1000
+
+UPDATE_SQL = '''
+UPDATE recipes_recipe AS r SET search_vector =
+    setweight(to_tsvector('{config}', r.name), 'A')
+    || setweight(to_tsvector('{config}', coalesce((
+        SELECT string_agg(t.name, ' ') FROM recipes_tag t
+        JOIN recipes_recipe_tags rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = r.id), '')), 'B')
+    || setweight(to_tsvector('{config}', coalesce((
+        SELECT string_agg(i.name, ' ') FROM recipes_ingredient i
+        JOIN recipes_ingredientinrecipe ir ON ir.ingredients_id = i.id
+        WHERE ir.recipe_id = r.id), '')), 'C')
+    || setweight(to_tsvector('{config}', r.text), 'D')
+WHERE r.id IN ({ids})
+'''
+
+WORD = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'и в во на с со к ко по из у о об от до за для без под над при а но '
+    'или не же ли то как'.split()
+)
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ого', 'его', 'ому',
+    'ему', 'ыми', 'ими', 'ать', 'ять', 'ить', 'еть', 'ая', 'яя', 'ое', 'ее',
+    'ие', 'ые', 'ой', 'ей', 'ий', 'ый', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях',
+    'ию', 'ью', 'ия', 'ья', 'ов', 'ев', 'es', 'ы', 'и', 'а', 'я', 'о', 'е',
+    'у', 'ю', 'ь', 'й', 's',
+), key=len, reverse=True)
+
+
+def stem(word):
+    # Лёгкий стеммер: отрезает самое длинное окончание, оставляя
+    # основу не короче трёх букв.
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def terms(text):
+    return [stem(word) for word in WORD.findall(normalize(text))
+            if word not in STOP_WORDS]
+
+
+def refresh_search_vectors(recipes):
+    # recipes — QuerySet рецептов; вне PostgreSQL вектора не нужны.
+    connection = connections[recipes.db]
+    if connection.vendor != 'postgresql':
+        return
+    sql, params = recipes.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_SQL.format(config=CONFIG, ids=sql), params)
+
+
+class SearchIndex(RecipeIndex):
+    """Обратный индекс «основа слова -> {id рецепта: вес}» без PostgreSQL.
+
+    Покрывает название (A), тэги (B), ингредиенты (C) и текст (D)
+    рецепта; вес терма — сумма весов его вхождений.
+    """
+
+    catalogs = (tags_catalog.name, ingredients_catalog.name)
+
+    def __init__(self):
+        super().__init__()
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def read(self, recipe_ids=None):
+        recipes = Recipe.objects.all()
+        tags = Recipe.tags.through.objects.all()
+        ingredients = IngredientInRecipe.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            tags = tags.filter(recipe_id__in=recipe_ids)
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        fields = {}
+        for pk, name, text in recipes.values_list('id', 'name', 'text'):
+            fields[pk] = [('A', name), ('D', text)]
+        for pk, name in tags.values_list('recipe_id', 'tag__name'):
+            if pk in fields:
+                fields[pk].append(('B', name))
+        for pk, name in ingredients.values_list('recipe_id',
+                                                'ingredients__name'):
+            if pk in fields:
+                fields[pk].append(('C', name))
+        return fields
+
+    def set_recipe(self, recipe_id, fields):
+        for term in self.documents.pop(recipe_id, ()):
+            self.postings[term].pop(recipe_id, None)
+        scores = defaultdict(float)
+        for weight, text in fields:
+            for term in terms(text):
+                scores[term] += WEIGHTS[weight]
+        for term, score in scores.items():
+            self.postings[term][recipe_id] = score
+        if scores:
+            self.documents[recipe_id] = tuple(scores)
+
+    def load_all(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        for recipe_id, fields in self.read().items():
+            self.set_recipe(recipe_id, fields)
+
+    def reload(self, recipe_ids):
+        fields = self.read(recipe_ids)
+        for recipe_id in recipe_ids:
+            self.set_recipe(recipe_id, fields.get(recipe_id, ()))
+
+    def forget(self, recipe_ids):
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self.set_recipe(recipe_id, ())
+
+    def search(self, query):
+        # Рецепты, содержащие все слова запроса, как plainto_tsquery.
+        self.ensure_current()
+        query_terms = set(terms(query))
+        if not query_terms:
+            return {}
+        with self.lock:
+            postings = sorted((self.postings.get(term, {})
+                               for term in query_terms), key=len)
+            return {
+                pk: sum(posting[pk] for posting in postings)
+                for pk in postings[0]
+                if all(pk in posting for posting in postings[1:])
+            }
+
+
+search_index = SearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и упорядочивает по релевантности.
+
+    На PostgreSQL — search_vector @@ plainto_tsquery с GIN-индексом и
+    ts_rank, иначе — SearchIndex и лучшие FALLBACK_LIMIT рецептов.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query))
+    else:
+        scores = search_index.search(query)
+        top = sorted(scores, key=lambda pk: (-scores[pk], -pk))[
+            :FALLBACK_LIMIT]
+        queryset = queryset.filter(id__in=top).annotate(
+            search_rank=Case(
+                *[When(id=pk, then=Value(scores[pk])) for pk in top],
+                default=Value(0.0), output_field=FloatField()
+            ))
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
@@ -8,6 +11,9 @@ from recipes.models import (Favorite,  # isort:skip
                             Recipe, ShoppingCart, Tag)  # isort:skip
 from users.models import Follow, User   # isort:skip
 from .fields import ImageField, TagsField  # isort:skip
+from .loaders import (BatchedField, BatchedListSerializer,  # isort:skip
+                      FavoriteLoader, FollowLoader,  # isort:skip
+                      LatestRecipesLoader, ShoppingCartLoader)  # isort:skip
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -19,20 +25,14 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 
 class CustomUserSerializer(UserSerializer):
-    is_subscribed = SerializerMethodField()
+    is_subscribed = BatchedField(FollowLoader)
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed')
         read_only_fields = ['id']
-
-    def get_is_subscribed(self, author):
-        user = self.context.get('request').user
-        return not user.is_anonymous and Follow.objects.filter(
-            user=user,
-            author=author.id
-        ).exists()
+        list_serializer_class = BatchedListSerializer
 
 
 class EmailSerializer(serializers.ModelSerializer):
@@ -78,27 +78,18 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True
     )
-    is_favorited = serializers.SerializerMethodField(read_only=True)
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
-    image = ImageField()
-
-    def get_is_favorited(self, recipe):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=recipe).exists()
-
-    def get_is_in_shopping_cart(self, recipe):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(user=user, recipe=recipe).exists()
+    is_favorited = BatchedField(FavoriteLoader)
+    is_in_shopping_cart = BatchedField(ShoppingCartLoader)
+    image = ImageField(variant='card')
+    image_webp = ImageField(source='image', variant='card', webp=True,
+                            read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_webp',
+                  'text', 'cooking_time')
+        list_serializer_class = BatchedListSerializer
 
 
 class RecipeWriteSerializer(RecipeGetSerializer):
@@ -143,12 +134,14 @@ class RecipeWriteSerializer(RecipeGetSerializer):
             raise ValidationError('В рецепте не заполнены ингредиенты!')
         return ingredients
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredient_to_recipe')
         recipe = Recipe.objects.create(**validated_data)
         return self.update_related_data(ingredients_data, tags_data, recipe)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredient_to_recipe')
@@ -156,19 +149,44 @@ class RecipeWriteSerializer(RecipeGetSerializer):
         return self.update_related_data(ingredients_data, tags_data, instance)
 
     def update_related_data(self, ingredients_data, tags_data, recipe):
-        recipe.tags.clear()
-        recipe.ingredients.clear()
         recipe.tags.set(tags_data)
-        for ingredient_el in ingredients_data:
-            ingredient_id = ingredient_el['ingredients'].get('id')
-            ingredient = get_object_or_404(Ingredient, id=ingredient_id)
-            IngredientInRecipe.objects.update_or_create(
-                recipe=recipe,
-                ingredients=ingredient,
-                amount=ingredient_el['amount']
-            )
+        amounts = {
+            ingredient_el['ingredients'].get('id'): ingredient_el['amount']
+            for ingredient_el in ingredients_data
+        }
+        existing = {row.ingredients_id: row
+                    for row in recipe.ingredient_to_recipe.all()}
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredients_id=ingredient_id,
+                               amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            recipe.ingredient_to_recipe.filter(
+                ingredients_id__in=removed
+            ).delete()
+        recipe._prefetched_objects_cache = {}
         return recipe
 
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', Prefetch(
+                'ingredient_to_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredients')
+            )
+        )
+        return RecipeGetSerializer(instance, context=self.context).data
+
     def validate(self, data):
         request = self.context.get('request')
         if request.method == 'DELETE':
@@ -186,6 +204,12 @@ class RecipeWriteSerializer(RecipeGetSerializer):
         if len(ingredients) != len(set(ingredients)):
             raise serializers.ValidationError(
                 'В запросе присутствуют дублирующиеся ингредиенты')
+        missing = set(ingredients) - Ingredient.objects.in_bulk(
+            ingredients).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: {}'.format(
+                    ', '.join(map(str, sorted(missing)))))
         if len(data['tags']) != len(set(data['tags'])):
             raise serializers.ValidationError(
                 'В запросе присутствуют дублирующиеся тэги')
@@ -194,16 +218,18 @@ class RecipeWriteSerializer(RecipeGetSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_webp',
+                  'text', 'cooking_time')
 
 
 class RecipeInFollowSerializer(serializers.ModelSerializer):
-    image = ImageField()
+    image = ImageField(variant='thumb')
+    image_webp = ImageField(source='image', variant='thumb', webp=True,
+                            read_only=True)
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_webp')
         read_only_fields = ('id',)
 
 
@@ -213,7 +239,10 @@ class ShoppingListSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='recipe.name', read_only=True)
     cooking_time = serializers.CharField(source='recipe.cooking_time',
                                          read_only=True)
-    image = serializers.CharField(source='recipe.image', read_only=True)
+    image = ImageField(source='recipe.image', variant='thumb',
+                       read_only=True)
+    image_webp = ImageField(source='recipe.image', variant='thumb',
+                            webp=True, read_only=True)
 
     def validate(self, data):
         request = self.context.get('request')
@@ -229,7 +258,7 @@ class ShoppingListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_webp')
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -240,8 +269,9 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                                        read_only=True)
     last_name = serializers.CharField(source='author.last_name',
                                       read_only=True)
-    is_subscribed = serializers.BooleanField(read_only=True)
-    recipes = serializers.SerializerMethodField(read_only=True)
+    is_subscribed = BatchedField(FollowLoader, key='author_id')
+    recipes = BatchedField(LatestRecipesLoader, key='author_id',
+                           serializer_class=RecipeInFollowSerializer)
     recipes_count = SerializerMethodField()
 
     class Meta:
@@ -249,22 +279,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username',
                   'first_name', 'last_name',
                   'recipes_count', 'recipes', 'is_subscribed')
+        list_serializer_class = BatchedListSerializer
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
-
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        if request.GET.get('recipes_limit'):
-            recipes_limit = int(request.GET.get('recipes_limit'))
-            queryset = Recipe.objects.filter(author=obj.author).order_by(
-                '-pub_date')[:recipes_limit]
-        else:
-            queryset = Recipe.objects.filter(author=obj.author).order_by(
-                '-pub_date')
-        return RecipeInFollowSerializer(queryset,
-                                        read_only=True,
-                                        many=True).data
+        return obj.author.recipes_count
 
     def validate(self, data):
         request = self.context.get('request')
@@ -287,7 +305,10 @@ class FavoriteSerializer (serializers.ModelSerializer):
     name = serializers.CharField(source='recipe.name', read_only=True)
     cooking_time = serializers.CharField(source='recipe.cooking_time',
                                          read_only=True)
-    image = serializers.CharField(source='recipe.image', read_only=True)
+    image = ImageField(source='recipe.image', variant='thumb',
+                       read_only=True)
+    image_webp = ImageField(source='recipe.image', variant='thumb',
+                            webp=True, read_only=True)
 
     def validate(self, data):
         request = self.context.get('request')
@@ -305,4 +326,12 @@ class FavoriteSerializer (serializers.ModelSerializer):
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_webp')
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.PANTRY_MAX_INGREDIENTS
+    )
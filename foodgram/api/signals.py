@@ -0,0 +1,247 @@
+import copy
+import threading
+
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .autocomplete import ingredients_index
+from .cache import bump_version, tags_catalog
+from .feed import backfill, fan_out, forget
+from .images import variant_builder, variants_built
+from .pantry import pantry_index
+from .search import refresh_search_vectors
+from .similar import similar_refresher
+
+from recipes.models import (Favorite, Ingredient,  # isort:skip
+                            IngredientInRecipe, Recipe,  # isort:skip
+                            ShoppingCart, SimilarRecipe,  # isort:skip
+                            Tag)  # isort:skip
+from users.models import Follow, User  # isort:skip
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags_catalog(**kwargs):
+    # Новая версия до коммита дала бы другим воркерам собрать и
+    # закэшировать под ней справочник из старых строк.
+    transaction.on_commit(tags_catalog.invalidate)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(instance, **kwargs):
+    # Связи с рецептами удалены каскадом без m2m_changed.
+    if instance.bit is not None:
+        Recipe.objects.filter(tags_mask__bitany=instance.mask).update(
+            tags_mask=F('tags_mask').bitand(~instance.mask))
+
+
+def schedule_search_refresh(recipes):
+    transaction.on_commit(lambda: refresh_search_vectors(recipes))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # tag.recipes.add()/remove()/clear(): затронутые рецепты —
+        # pk_set, а для clear — все рецепты тэга до очистки.
+        if action == 'pre_clear':
+            instance._cleared_recipes = list(
+                instance.recipes.values_list('id', flat=True))
+            return
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_recipes', ())
+        elif action not in ('post_add', 'post_remove'):
+            return
+        recipes = Recipe.objects.filter(id__in=list(pk_set))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        recipes = Recipe.objects.filter(id=instance.id)
+    else:
+        return
+    recipes.refresh_tags_mask()
+    schedule_search_refresh(recipes)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_search(instance, **kwargs):
+    schedule_search_refresh(Recipe.objects.filter(id=instance.id))
+
+
+# Рецепты, у которых в текущей транзакции менялись ингредиенты.
+touched_recipes = threading.local()
+
+
+def flush_touched_recipes():
+    # Первый из колбэков транзакции обрабатывает все её рецепты разом,
+    # остальные находят пустое множество.
+    recipe_ids = getattr(touched_recipes, 'ids', None)
+    if not recipe_ids:
+        return
+    touched_recipes.ids = set()
+    recipes = Recipe.objects.filter(id__in=list(recipe_ids))
+    recipes.update(updated_at=timezone.now())
+    bump_version('recipes')
+    refresh_search_vectors(recipes)
+    similar_refresher.schedule(recipe_ids)
+
+
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def touch_recipe(instance, **kwargs):
+    # Правка ингредиента рецепта отдельно от рецепта (например, в
+    # админке) должна сменить updated_at: по нему обновляются кэш
+    # фрагментов и индексы в памяти. Один UPDATE на транзакцию, а не
+    # на каждую строку.
+    if getattr(touched_recipes, 'ids', None) is None:
+        touched_recipes.ids = set()
+    touched_recipes.ids.add(instance.recipe_id)
+    transaction.on_commit(flush_touched_recipes)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_touched_recipe(instance, **kwargs):
+    # Ингредиенты удалённого рецепта ушли каскадом — обновлять нечего.
+    getattr(touched_recipes, 'ids', set()).discard(instance.id)
+
+
+@receiver(post_save, sender=Tag)
+def refresh_tag_search(instance, created, **kwargs):
+    if not created:
+        schedule_search_refresh(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredients_index(instance, created, **kwargs):
+    transaction.on_commit(lambda: ingredients_index.update(instance))
+    if not created:
+        schedule_search_refresh(
+            Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_from_ingredients_index(instance, **kwargs):
+    # К коммиту delete() уже обнулит pk у самого экземпляра.
+    ingredient = copy.copy(instance)
+    transaction.on_commit(
+        lambda: ingredients_index.update(ingredient, deleted=True))
+
+
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def invalidate_shopping_cart(instance, **kwargs):
+    name = 'shopping_cart:{}'.format(instance.user_id)
+    transaction.on_commit(lambda: bump_version(name))
+    # Счётчик рецепта сменил порядок ordering=popular.
+    transaction.on_commit(lambda: bump_version('popularity'))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def invalidate_favorites(instance, **kwargs):
+    name = 'favorites:{}'.format(instance.user_id)
+    transaction.on_commit(lambda: bump_version(name))
+    # Счётчик рецепта сменил порядок ordering=popular.
+    transaction.on_commit(lambda: bump_version('popularity'))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follows(instance, **kwargs):
+    name = 'follows:{}'.format(instance.user_id)
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(instance, update_fields, **kwargs):
+    # Вход пользователя сохраняет только last_login — в ответах его нет.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    name = 'author:{}'.format(instance.id)
+
+    def bump():
+        bump_version('authors')
+        bump_version(name)
+
+    transaction.on_commit(bump)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipes(**kwargs):
+    transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_pantry_index(instance, **kwargs):
+    # Изменения рецептов индекс подхватывает сам по updated_at,
+    # удаления в этом процессе убираем сразу.
+    recipe_id = instance.id
+    transaction.on_commit(lambda: pantry_index.forget([recipe_id]))
+
+
+def schedule_similar_refresh(recipe_ids):
+    transaction.on_commit(lambda: similar_refresher.schedule(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_similar_recipes(instance, **kwargs):
+    schedule_similar_refresh([instance.id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def refresh_similar_of_deleted(instance, **kwargs):
+    # Рецепты, у которых удаляемый был среди похожих, теряют соседа:
+    # их списки пересчитываются после удаления.
+    schedule_similar_refresh(list(SimilarRecipe.objects.filter(
+        similar=instance).values_list('recipe_id', flat=True)))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_variants(instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: variant_builder.schedule(name))
+
+
+@receiver(variants_built)
+def invalidate_images(**kwargs):
+    # Версия входит в ETag списка и карточки рецепта.
+    bump_version('images')
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    token_cache.invalidate(instance.key)
+    transaction.on_commit(lambda: token_cache.invalidate_user(
+        instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields, **kwargs):
+    # Смена пароля, блокировка и любые правки профиля сбрасывают
+    # закэшированного пользователя во всех воркерах.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: token_cache.invalidate_user(instance.id))
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out(user, **kwargs):
+    if user is not None:
+        token_cache.invalidate_user(user.id)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed(instance, **kwargs):
+    forget(instance)
@@ -0,0 +1,334 @@
+import heapq
+import logging
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .pantry import numpy, pantry_index
+
+from recipes.models import (IngredientInRecipe, Recipe,  # isort:skip
+                            SimilarRecipe)  # isort:skip
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+logger = logging.getLogger(__name__)
+
+# Веса пересобираются по всему индексу, когда число рецептов ушло от
+# учтённого в IDF больше чем на эту долю.
+WEIGHTS_MAX_DRIFT = 0.1
+BATCH_SIZE = 500
+
+
+def top(scores, k):
+    # Лучшие k пар (id, сходство): по убыванию сходства, затем id.
+    return heapq.nlargest(k, scores, key=lambda item: (item[1], item[0]))
+
+
+class IngredientVectors:
+    """TF-IDF векторы рецептов по ингредиентам.
+
+    TF — наличие ингредиента (количества в разных единицах не сравнить),
+    IDF — log(N / df). Ингредиенты из одного рецепта и из больше чем
+    max_df рецептов не учитываются. Векторы нормированы, поэтому
+    косинусное сходство — скалярное произведение. С SciPy матрица
+    разреженная и соседи считаются умножением блока строк на всю
+    матрицу, без неё — обходом списков рецептов по ингредиентам.
+    """
+
+    def __init__(self, postings, total):
+        self.weights = {
+            pk: math.log(total / len(posting))
+            for pk, posting in postings.items() if len(posting) < total
+        }
+        self.postings = {pk: postings[pk] for pk in self.weights}
+        if sparse is not None and numpy is not None:
+            self.build_matrix()
+        else:
+            self.build_lists()
+
+    @classmethod
+    def from_index(cls, index, max_df):
+        with index.lock:
+            total = sum(1 for size in index.sizes if size)
+            postings = {pk: posting[:]
+                        for pk, posting in index.postings.items()
+                        if 1 < len(posting) <= max_df}
+        return cls(postings, total)
+
+    def build_matrix(self):
+        columns = list(self.postings)
+        self.lists = None
+        self.matrix = None
+        self.ids = []
+        if not columns:
+            return
+        lengths = [len(self.postings[pk]) for pk in columns]
+        rows = numpy.concatenate([
+            numpy.frombuffer(self.postings[pk], dtype=numpy.intc)
+            for pk in columns
+        ])
+        data = numpy.repeat(
+            numpy.array([self.weights[pk] for pk in columns]), lengths)
+        norms = numpy.sqrt(numpy.bincount(rows, weights=data ** 2))
+        data /= norms[rows]
+        indptr = numpy.concatenate(([0], numpy.cumsum(lengths)))
+        matrix = sparse.csc_matrix((data, rows, indptr),
+                                   shape=(len(norms), len(columns)))
+        self.matrix = matrix.tocsr()
+        self.transposed = matrix.T.tocsr()
+        self.ids = numpy.flatnonzero(norms).tolist()
+
+    def build_lists(self):
+        self.matrix = None
+        self.lists = defaultdict(list)
+        self.norms = defaultdict(float)
+        for pk, posting in self.postings.items():
+            weight = self.weights[pk]
+            for recipe_id in posting:
+                self.lists[recipe_id].append(pk)
+                self.norms[recipe_id] += weight * weight
+        self.ids = sorted(self.lists)
+
+    def neighbours(self, recipe_ids, k):
+        if self.lists is not None:
+            return {pk: self.neighbours_python(pk, k) for pk in recipe_ids}
+        result = {pk: [] for pk in recipe_ids}
+        ids = [pk for pk in recipe_ids
+               if self.matrix is not None and pk < self.matrix.shape[0]]
+        if not ids:
+            return result
+        block = self.matrix[ids] @ self.transposed
+        for row, pk in enumerate(ids):
+            start, end = block.indptr[row], block.indptr[row + 1]
+            columns = block.indices[start:end]
+            scores = block.data[start:end]
+            keep = columns != pk
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > k:
+                best = numpy.argpartition(-scores, k)[:k]
+                columns, scores = columns[best], scores[best]
+            result[pk] = top(zip(columns.tolist(), scores.tolist()), k)
+        return result
+
+    def neighbours_python(self, recipe_id, k):
+        scores = defaultdict(float)
+        for pk in self.lists.get(recipe_id, ()):
+            weight = self.weights[pk] ** 2
+            for other in self.postings[pk]:
+                if other != recipe_id:
+                    scores[other] += weight
+        norm = self.norms[recipe_id]
+        return top(((pk, score / math.sqrt(norm * self.norms[pk]))
+                    for pk, score in scores.items()), k)
+
+
+def store(results):
+    # Заменяет списки соседей рецептов из results; рецепты, удалённые
+    # после сборки векторов, пропускаются.
+    ids = set(results).union(*(
+        (pk for pk, _ in rows) for rows in results.values()))
+    existing = set(Recipe.objects.filter(id__in=ids).values_list(
+        'id', flat=True))
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=list(results)).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=pk, score=score)
+            for recipe_id, rows in results.items() if recipe_id in existing
+            for pk, score in rows if pk in existing
+        )
+
+
+def build_all(k, chunk_size, max_df):
+    # Индекс и матрица строятся по всем рецептам сразу: chunk_size
+    # ограничивает только блок произведений и пачку записи в базу.
+    pantry_index.build(pantry_index.get_versions())
+    vectors = IngredientVectors.from_index(pantry_index, max_df)
+    for start in range(0, len(vectors.ids), chunk_size):
+        chunk = vectors.ids[start:start + chunk_size]
+        store(vectors.neighbours(chunk, k))
+        yield len(chunk)
+
+
+def recipe_ingredients(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        for recipe_id, pk in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids[start:start + BATCH_SIZE]
+        ).values_list('recipe_id', 'ingredients_id'):
+            ingredients[recipe_id].add(pk)
+    return ingredients
+
+
+class SimilarWeights:
+    """IDF ингредиентов и квадраты норм векторов рецептов для refresh.
+
+    Собираются по индексу кладовой один раз и живут, пока индекс не
+    пересобран целиком и число рецептов не ушло дальше
+    WEIGHTS_MAX_DRIFT: отдельная правка сдвигает IDF незаметно. Нормы
+    изменённых рецептов обновляются при каждом пересчёте. Ингредиенты
+    без веса и нормы рецептов, изменённых в других воркерах, уточнятся
+    при следующей сборке весов.
+    """
+
+    def __init__(self):
+        self.weights = None
+        self.norms = {}
+        self.total = 0
+        self.builds = None
+        self.max_df = None
+
+    def ensure(self, index, max_df):
+        # Вызывается под index.lock.
+        total = len(index.sizes) - index.sizes.count(0)
+        if (self.weights is None or self.builds != index.builds
+                or self.max_df != max_df
+                or abs(total - self.total) > WEIGHTS_MAX_DRIFT * self.total):
+            self.build(index, total, max_df)
+
+    def build(self, index, total, max_df):
+        self.weights = {
+            pk: math.log(total / len(posting))
+            for pk, posting in index.postings.items()
+            if 1 < len(posting) <= max_df and len(posting) < total
+        }
+        if numpy is not None and self.weights:
+            columns = list(self.weights)
+            rows = numpy.concatenate([
+                numpy.frombuffer(index.postings[pk], dtype=numpy.intc)
+                for pk in columns
+            ])
+            squares = numpy.repeat(
+                numpy.array([self.weights[pk] for pk in columns]) ** 2,
+                [len(index.postings[pk]) for pk in columns])
+            norms = numpy.bincount(rows, weights=squares)
+            ids = numpy.flatnonzero(norms)
+            self.norms = dict(zip(ids.tolist(), norms[ids].tolist()))
+        else:
+            norms = defaultdict(float)
+            for pk, weight in self.weights.items():
+                for recipe_id in index.postings[pk]:
+                    norms[recipe_id] += weight * weight
+            self.norms = dict(norms)
+        self.total = total
+        self.builds = index.builds
+        self.max_df = max_df
+
+    def set_recipes(self, ingredients):
+        # ingredients — {id рецепта: множество id ингредиентов}.
+        for recipe_id, ingredient_ids in ingredients.items():
+            norm = sum(self.weights[pk] ** 2 for pk in ingredient_ids
+                       if pk in self.weights)
+            if norm:
+                self.norms[recipe_id] = norm
+            else:
+                self.norms.pop(recipe_id, None)
+
+    def scores(self, index, recipe_id, ingredient_ids):
+        # Скалярные произведения с рецептами из списков ингредиентов
+        # рецепта — других кандидатов с ненулевым сходством нет.
+        scores = defaultdict(float)
+        for pk in ingredient_ids:
+            weight = self.weights.get(pk)
+            if weight is None:
+                continue
+            for other in index.postings.get(pk, ()):
+                if other != recipe_id:
+                    scores[other] += weight * weight
+        return scores
+
+    def neighbours(self, recipe_id, scores, k):
+        norm = self.norms.get(recipe_id)
+        if not norm:
+            return []
+        return top(((pk, score / math.sqrt(norm * self.norms[pk]))
+                    for pk, score in scores.items() if pk in self.norms), k)
+
+
+similar_weights = SimilarWeights()
+
+
+def refresh(recipe_ids, k, max_df):
+    """Пересчитывает соседей изменённых рецептов.
+
+    Кандидаты — только рецепты из списков ингредиентов изменённого
+    рецепта, веса берутся из similar_weights, матрица не строится.
+    Новые сходства добавляются и в списки найденных соседей, если
+    проходят в их top-k. Рецепт, выпавший из чужого top-k после правки,
+    уйдёт оттуда при следующей полной сборке.
+    """
+    # Сигнал о правке может опередить смену версии рецептов в кэше.
+    pantry_index.ensure_current()
+    with pantry_index.lock:
+        ingredients = pantry_index.reload(recipe_ids)
+        similar_weights.ensure(pantry_index, max_df)
+        similar_weights.set_recipes(ingredients)
+        products = {recipe_id: similar_weights.scores(
+            pantry_index, recipe_id, ingredient_ids)
+            for recipe_id, ingredient_ids in ingredients.items()}
+    # Рецепты, добавленные после сборки весов в другом воркере.
+    missing = set().union(*products.values()) - similar_weights.norms.keys()
+    if missing:
+        similar_weights.set_recipes(recipe_ingredients(missing))
+    results = {recipe_id: similar_weights.neighbours(recipe_id, scores, k)
+               for recipe_id, scores in products.items()}
+    additions = defaultdict(dict)
+    for recipe_id, rows in results.items():
+        for pk, score in rows:
+            if pk not in results:
+                additions[pk][recipe_id] = score
+    current = defaultdict(dict)
+    for recipe_id, pk, score in SimilarRecipe.objects.filter(
+            recipe_id__in=list(additions)).values_list(
+            'recipe_id', 'similar_id', 'score'):
+        current[recipe_id][pk] = score
+    for pk, scores in additions.items():
+        merged = {**current[pk], **scores}
+        rows = top(merged.items(), k)
+        if rows != top(current[pk].items(), k):
+            results[pk] = rows
+    store(results)
+
+
+class SimilarRefresher:
+    # Изменённые рецепты копятся и пересчитываются одним фоновым
+    # потоком: пока идёт пересчёт, новые правки ждут следующего.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.queued = False
+        self.executor = None
+
+    def schedule(self, recipe_ids):
+        with self.lock:
+            self.pending.update(recipe_ids)
+            if self.queued or not self.pending:
+                return
+            self.queued = True
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='similar-recipes')
+        self.executor.submit(self.run)
+
+    def run(self):
+        with self.lock:
+            recipe_ids, self.pending = self.pending, set()
+            self.queued = False
+        try:
+            refresh(recipe_ids, settings.SIMILAR_RECIPES_TOP_K,
+                    settings.SIMILAR_RECIPES_MAX_DF)
+        except Exception:
+            logger.exception('Не удалось пересчитать похожие рецепты')
+        finally:
+            connections.close_all()
+
+
+similar_refresher = SimilarRefresher()
@@ -0,0 +1,94 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+
+from recipes.models import (Favorite, Recipe,  # isort:skip
+                            RecipePopularity, ShoppingCart)  # isort:skip
+
+EVENTS = ((Favorite, 1.0), (ShoppingCart, 1.0))
+# Через десять периодов полураспада вклад события меньше 0.001.
+WINDOW_HALF_LIVES = 10
+MIN_SCORE = 0.001
+BATCH_SIZE = 500
+
+
+def decay(age):
+    return 0.5 ** (age.total_seconds() / settings.TRENDING_HALF_LIFE)
+
+
+def chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def collect(since, now):
+    scores = defaultdict(float)
+    for model, weight in EVENTS:
+        events = model.objects.filter(
+            created_at__gte=since, created_at__lt=now
+        ).values_list('recipe_id', 'created_at')
+        for recipe_id, created_at in events.iterator():
+            scores[recipe_id] += weight * decay(now - created_at)
+    return scores
+
+
+def refresh_popularity(now=None, rebuild=False):
+    """Досчитывает популярность рецептов в RecipePopularity.
+
+    Все оценки затухают одинаково, поэтому хранимые оценки умножаются
+    на общий множитель с прошлого пересчёта, а к ним добавляются только
+    новые события. Без прошлых оценок (или с rebuild) таблица
+    собирается заново по событиям за WINDOW_HALF_LIVES полураспадов.
+    Удаление из избранного или корзины оценку не уменьшает.
+    """
+    now = now or timezone.now()
+    last = None
+    if not rebuild:
+        last = RecipePopularity.objects.aggregate(
+            last=Max('refreshed_at'))['last']
+    since = last or now - timedelta(
+        seconds=settings.TRENDING_HALF_LIFE * WINDOW_HALF_LIVES)
+    scores = collect(since, now)
+    with transaction.atomic():
+        if last is None:
+            RecipePopularity.objects.all().delete()
+        else:
+            RecipePopularity.objects.update(
+                score=F('score') * decay(now - last), refreshed_at=now)
+            RecipePopularity.objects.filter(score__lt=MIN_SCORE).delete()
+        for recipe_ids in chunks(scores):
+            rows = list(RecipePopularity.objects.filter(
+                recipe_id__in=recipe_ids))
+            for row in rows:
+                row.score += scores.pop(row.recipe_id)
+            RecipePopularity.objects.bulk_update(rows, ('score',))
+            RecipePopularity.objects.bulk_create(
+                RecipePopularity(recipe_id=recipe_id,
+                                 score=scores[recipe_id], refreshed_at=now)
+                for recipe_id in Recipe.objects.filter(
+                    id__in=[pk for pk in recipe_ids if pk in scores]
+                ).values_list('id', flat=True)
+            )
+        transaction.on_commit(lambda: bump_version('trending'))
+    return RecipePopularity.objects.count()
+
+
+def trending_recipes():
+    # Пары (id, оценка) самых популярных рецептов; список в кэше
+    # меняется с каждым пересчётом.
+    key = 'trending:{}'.format(get_version('trending'))
+    recipes = cache.get(key)
+    if recipes is None:
+        recipes = list(RecipePopularity.objects.order_by(
+            '-score', '-recipe_id'
+        ).values_list('recipe_id', 'score')[:settings.TRENDING_RECIPES_LIMIT])
+        cache.set(key, recipes, settings.TRENDING_CACHE_TIMEOUT)
+    return recipes
@@ -1,30 +1,45 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Exists, OuterRef, Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 # from rest_framework import filters, status, viewsets
-from rest_framework import filters, viewsets
+from rest_framework import generics, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
-# from rest_framework.response import Response
+from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .filters import RecipeFilter
-from .mixins import (CreateDestroyMixin, CustomShoppingFavoriteMixin,
-                     ListOneMixin)
-from .pagination import PaginatorLimit
+from .cache import (cache_stream, ingredients_catalog, shopping_cart_key,
+                    tags_catalog)
+from .counters import change_counter
+from .feed import Feed, FeedPagination, return_to_push
+from .filters import IngredientSearchFilter, RecipeFilter
+from .fragments import recipe_fragments
+from .mixins import (CatalogListMixin, ConditionalRecipeMixin,
+                     CreateDestroyMixin, CustomShoppingFavoriteMixin,
+                     ListOneMixin, RecipeFragmentMixin)
+from .pagination import PaginatorLimit, PaginatorLimitCursor, get_similar_limit
+from .pantry import pantry_index
+from .parsers import FastJSONParser, RecipeMultiPartParser
 from .permissions import OwnerOrReadOnly
+from .renderers import SHOPPING_CART_RENDERERS
 from .serializers import (CustomUserSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeGetSerializer,
-                          RecipeWriteSerializer, ShoppingListSerializer,
-                          SubscriptionSerializer, TagSerializer)
+                          IngredientSerializer, PantrySerializer,
+                          RecipeGetSerializer, RecipeWriteSerializer,
+                          ShoppingListSerializer, SubscriptionSerializer,
+                          TagSerializer)
+from .trending import trending_recipes
 
 from recipes.models import (Favorite, Ingredient,  # isort:skip
                             IngredientInRecipe, Recipe,  # isort:skip
-                            ShoppingCart, Tag)  # isort:skip
+                            ShoppingCart, SimilarRecipe,  # isort:skip
+                            Tag)  # isort:skip
 from users.models import Follow  # isort:skip
 
 User = get_user_model()
@@ -34,7 +49,14 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [AllowAny]
-    pagination_class = PaginatorLimit
+    pagination_class = PaginatorLimitCursor
+    keyset_fields = ('id',)
+
+    def get_queryset(self):
+        return super().get_queryset().annotate(is_subscribed=Exists(
+            Follow.objects.filter(user_id=self.request.user.id,
+                                  author=OuterRef('id'))
+        ))
 
     @action(
         detail=False,
@@ -45,53 +67,127 @@ class CustomUserViewSet(UserViewSet):
         return super(CustomUserViewSet, self).me(request, *args, **kwargs)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogListMixin, ReadOnlyModelViewSet):
+    catalog = tags_catalog
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientsViewSet(ListOneMixin):
+class IngredientsViewSet(CatalogListMixin, ListOneMixin):
+    catalog = ingredients_catalog
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    filter_backends = (IngredientSearchFilter,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(ConditionalRecipeMixin, RecipeFragmentMixin,
+                    viewsets.ModelViewSet):
     permission_classes = (OwnerOrReadOnly,)
+    parser_classes = (FastJSONParser, RecipeMultiPartParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = PaginatorLimit
+    pagination_class = PaginatorLimitCursor
+
+    queryset = Recipe.objects.all()
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeWriteSerializer
         return RecipeGetSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        change_counter(User, self.request.user.pk, 'recipes_count', 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        paginator = FeedPagination()
+        keys = paginator.paginate_queryset(Feed(request.user), request, self)
+        recipes = self.get_fragment_queryset().in_bulk(
+            [pk for _, pk in keys])
+        return paginator.get_paginated_response(recipe_fragments.render(
+            [recipes[pk] for _, pk in keys if pk in recipes],
+            self.get_serializer_context()
+        ))
+
+    @action(detail=False, methods=['get'])
+    def match(self, request):
+        serializer = PantrySerializer(data={
+            'ingredients': request.query_params.getlist('ingredients')})
+        serializer.is_valid(raise_exception=True)
+        paginator = PaginatorLimit()
+        page = paginator.paginate_queryset(
+            pantry_index.match(serializer.validated_data['ingredients']),
+            request, self)
+        results = self.render_ranked(page, lambda matched, total: {
+            'matched_count': matched,
+            'missing_count': total - matched,
+            'match_ratio': round(matched / total, 3),
+        })
+        found = {item['id'] for item in results}
+        deleted = [pk for pk, _, _ in page if pk not in found]
+        if deleted:
+            pantry_index.forget(deleted)
+        return paginator.get_paginated_response(results)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        paginator = PaginatorLimit()
+        page = paginator.paginate_queryset(trending_recipes(), request, self)
+        return paginator.get_paginated_response(self.render_ranked(
+            page, lambda score: {'popularity': round(score, 3)}))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        generics.get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        similar = list(SimilarRecipe.objects.filter(recipe_id=pk).order_by(
+            '-score', '-similar_id').values_list('similar_id', 'score')[
+            :get_similar_limit(request)])
+        return Response(self.render_ranked(
+            similar, lambda score: {'similarity': round(score, 3)}))
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_CART_RENDERERS)
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredients__name',
-            'ingredients__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-        shopping_list = ['{} ({}) - {}\n'.format(
-            ingredient['ingredients__name'],
-            ingredient['ingredients__measurement_unit'],
-            ingredient['total_amount']
-        ) for ingredient in ingredients]
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        attachment = 'attachment; filename="shopping_list.txt"'
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += '; charset=' + renderer.charset
+        key = shopping_cart_key(request.user.id, renderer.format)
+        content = cache.get(key)
+        if content is not None:
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            ingredients = IngredientInRecipe.objects.filter(
+                recipe__shopping_cart__user=request.user
+            ).values_list(
+                'ingredients__name',
+                'ingredients__measurement_unit'
+            ).annotate(
+                total_amount=Sum('amount')
+            ).order_by(
+                'ingredients__name',
+                'ingredients__measurement_unit'
+            ).iterator(chunk_size=settings.SHOPPING_CART_CHUNK_SIZE)
+            response = StreamingHttpResponse(
+                cache_stream(key, renderer.render_rows(ingredients),
+                             settings.SHOPPING_CART_CACHE_TIMEOUT),
+                content_type=content_type
+            )
+        attachment = 'attachment; filename="shopping_list.{}"'.format(
+            renderer.format)
         response['Content-Disposition'] = attachment
         return response
 
@@ -100,16 +196,15 @@ class SubscriptionListView(ListAPIView):
     model = Follow
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = PaginatorLimit
 
     def get_queryset(self):
-        user_id = self.request.user.id
-        return (self.request.user.follower.all()
-                .annotate(recipes_count=Count('author__recipes'))
-                .annotate(is_subscribed=Exists(
-                    Follow.objects.filter(
-                        user_id=user_id, author__id=OuterRef('id')
-                    )
-                )))
+        # Последние рецепты авторов догружает BatchedListSerializer.
+        # На каждого автора из списка пользователь подписан.
+        return (self.request.user.follower.select_related('author')
+                .annotate(is_subscribed=Value(
+                    True, output_field=BooleanField()))
+                .order_by('id'))
 
     def perform_create(self, serializer):
         author = get_object_or_404(User, id=self.kwargs.get('author_id'))
@@ -125,10 +220,13 @@ class SubscriptionViewSet(CreateDestroyMixin):
     def get_queryset(self):
         return Follow.objects.filter(user=self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         author = get_object_or_404(User, id=self.kwargs.get(self.lookup_field))
         serializer.save(user=self.request.user, author=author)
+        change_counter(User, author.pk, 'followers_count', 1)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
         author = get_object_or_404(User, id=self.kwargs.get('author_id'))
         user = self.request.user
@@ -136,15 +234,19 @@ class SubscriptionViewSet(CreateDestroyMixin):
                                      user=user,
                                      author=author)
         instance.delete()
+        change_counter(User, author.pk, 'followers_count', -1)
+        transaction.on_commit(lambda: return_to_push(author.pk))
 
 
 class ShoppingListViewSet(CustomShoppingFavoriteMixin):
     model = ShoppingCart
     serializer_class = ShoppingListSerializer
+    counter_field = 'shopping_cart_count'
     queryset = ShoppingCart.objects.all()
 
 
 class FavoriteViewSet(CustomShoppingFavoriteMixin):
     model = Favorite
     serializer_class = FavoriteSerializer
+    counter_field = 'favorites_count'
     queryset = Favorite.objects.all()
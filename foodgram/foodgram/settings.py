@@ -94,13 +94,118 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        # По умолчанию у locmem и файлового кэша 300 записей: версии и
+        # справочники вытеснялись бы при обычной нагрузке.
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES',
+                                         default=10000)),
+        },
+    },
+    # Фрагменты рецептов — по записи на рецепт: отдельный кэш, чтобы
+    # они не вытесняли версии и справочники из default.
+    'fragments': {
+        'BACKEND': os.getenv(
+            'FRAGMENT_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('FRAGMENT_CACHE_LOCATION',
+                              default='foodgram-fragments'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES',
+                                         default=50000)),
+        },
+    },
+}
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=86400))
+
+STREAM_CACHE_MAX_SIZE = 1024 * 1024
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+SHOPPING_CART_CHUNK_SIZE = 500
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+# Сборка рецептов из .values() вместо RecipeGetSerializer; результат
+# совпадает побайтно (см. tests/test_fast_serializers.py).
+FAST_READ_SERIALIZERS = os.getenv(
+    'FAST_READ_SERIALIZERS', default='True') == 'True'
+
+RECIPES_LIMIT_MAX = 10
+
+MAX_PAGE_SIZE = 100
+
+PANTRY_MAX_INGREDIENTS = 100
+
+SIMILAR_RECIPES_TOP_K = 20
+# Ингредиенты, которые есть в большем числе рецептов, не учитываются
+# в сходстве: вес у них почти нулевой, а пересчёт они замедляют.
+SIMILAR_RECIPES_MAX_DF = 10000
+SIMILAR_RECIPES_CHUNK_SIZE = 500
+
+# Вклад добавления в избранное или корзину в популярность рецепта
+# уменьшается вдвое каждые TRENDING_HALF_LIFE секунд.
+TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE',
+                                   default=3 * 24 * 60 * 60))
+TRENDING_RECIPES_LIMIT = 100
+TRENDING_CACHE_TIMEOUT = 60 * 60
+
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 50
+
+# С locmem выход или смена пароля в одном воркере доходят до остальных
+# не позже чем через AUTH_TOKEN_CACHE_TTL; с общим кэшем — сразу.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 5 * 60
+# Хранить токены и в общем кэше (имеет смысл с общим CACHE_BACKEND).
+AUTH_TOKEN_CACHE_SHARED = os.getenv(
+    'AUTH_TOKEN_CACHE_SHARED', default='False') == 'True'
+# Путь к функции (source, hit_rate), вызываемой на каждую проверку токена.
+AUTH_TOKEN_CACHE_METRICS_HOOK = os.getenv('AUTH_TOKEN_CACHE_METRICS_HOOK')
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+IMAGE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+# Части multipart крупнее этого размера пишутся во временный файл.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+IMAGE_MAX_PIXELS = 8000 * 5000
+IMAGE_QUALITY = 85
+IMAGE_VARIANTS = {
+    'card': (640, 640),
+    'thumb': (240, 240),
+}
+IMAGE_VARIANT_WORKERS = 2
+# Имён готовых вариантов и битых оригиналов в памяти воркера.
+IMAGE_VARIANT_CACHE_SIZE = 20000
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
@@ -14,11 +14,14 @@ class RecipeIngredientInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'name', 'count_in_favorites')
+    list_select_related = ('author',)
     list_filter = ('author', 'name', 'tags')
     inlines = (RecipeIngredientInline, )
 
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
+
     def count_in_favorites(self, recipe):
-        return Favorite.objects.filter(recipe=recipe).count()
+        return recipe.favorites_count
 
 
 admin.site.register(Ingredient, IngredientAdmin)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+from api.images import build_variants, variants_built  # isort:skip
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии и WebP-варианты картинок рецептов, '
+            'для которых их ещё нет (например, загруженных до появления '
+            'вариантов).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересобрать уже существующие варианты')
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        built = failed = 0
+        ready = []
+        for name in names.iterator():
+            try:
+                created = build_variants(name, force=options['force'])
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write('{}: {}'.format(name, error))
+                continue
+            if created:
+                built += len(created)
+                ready.append(name)
+        if ready:
+            variants_built.send(sender=self.__class__, names=ready)
+        self.stdout.write(self.style.SUCCESS(
+            'Создано вариантов: {}, ошибок: {}'.format(built, failed)))
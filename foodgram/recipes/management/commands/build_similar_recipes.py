@@ -0,0 +1,43 @@
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.similar import build_all  # isort:skip
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты по TF-IDF векторам '
+            'ингредиентов и сохраняет для каждого рецепта top-k соседей. '
+            'Запускается по расписанию: правки рецептов между запусками '
+            'учитываются фоново и приблизительно. Индекс кладовой и '
+            'матрица векторов целиком держатся в памяти (около 30 байт '
+            'на пару рецепт-ингредиент); --chunk-size ограничивает только '
+            'блок произведений на соседей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int,
+                            default=settings.SIMILAR_RECIPES_TOP_K)
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.SIMILAR_RECIPES_CHUNK_SIZE,
+                            help='Рецептов в одном блоке умножения матриц; на '
+                                 'память под саму матрицу не влияет')
+        parser.add_argument('--max-df', type=int,
+                            default=settings.SIMILAR_RECIPES_MAX_DF,
+                            help='Не учитывать ингредиенты из большего '
+                                 'числа рецептов')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = 0
+        for count in build_all(options['top_k'], options['chunk_size'],
+                               options['max_df']):
+            done += count
+            if options['verbosity'] > 1:
+                self.stdout.write('{} рецептов, {:.0f} с'.format(
+                    done, time.perf_counter() - started))
+        self.stdout.write(self.style.SUCCESS(
+            'Рецептов: {}, {:.1f} с, пик памяти {} МБ'.format(
+                done, time.perf_counter() - started,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)))
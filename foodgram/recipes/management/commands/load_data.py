@@ -1,16 +1,147 @@
+import csv
 import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import Ingredient, Tag
+
+from api.cache import ingredients_catalog, tags_catalog  # isort:skip
+
+FIELDS = {
+    'ingredients': ('name', 'measurement_unit'),
+    'tags': ('name', 'color', 'slug'),
+}
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != '[':
+                raise CommandError('Ожидался JSON-массив объектов')
+            started = True
+            pos += 1
+            continue
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON в позиции {}'.format(
+                    pos))
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_csv(f, fields):
+    for row in csv.reader(f):
+        if not row:
+            continue
+        if tuple(cell.strip() for cell in row) == fields:
+            continue
+        yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты или тэги из JSON/CSV. Повторный запуск '
+            'не создаёт дублей: записи сверяются по названию и единице '
+            'измерения (для тэгов — по slug).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='ingredients.json')
+        parser.add_argument('--model', choices=FIELDS, default='ingredients')
+        parser.add_argument('--format', choices=('json', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def read_rows(self, path, file_format, fields):
+        file_format = file_format or os.path.splitext(path)[1][1:].lower()
+        if file_format not in ('json', 'csv'):
+            raise CommandError('Не удалось определить формат файла')
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = (iter_json_array(f) if file_format == 'json'
+                    else iter_csv(f, fields))
+            for number, row in enumerate(rows, 1):
+                try:
+                    if not isinstance(row, dict):
+                        raise TypeError
+                    yield {field: row[field].strip() for field in fields}
+                except (KeyError, AttributeError, TypeError):
+                    raise CommandError('Некорректная запись №{}: {}'.format(
+                        number, row))
+
+    def load_ingredients(self, rows, batch_size):
+        seen = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+        created = skipped = 0
+        batch = []
+        for row in rows:
+            key = (row['name'], row['measurement_unit'])
+            if key in seen:
+                skipped += 1
+                continue
+            seen.add(key)
+            batch.append(Ingredient(**row))
+            if len(batch) >= batch_size:
+                Ingredient.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
+        return created + len(batch), 0, skipped
+
+    def load_tags(self, rows, batch_size):
+        existing = {tag.slug: tag for tag in Tag.objects.all()}
+        new, changed = {}, {}
+        skipped = 0
+        for row in rows:
+            tag = existing.get(row['slug'])
+            if tag is None:
+                new[row['slug']] = Tag(**row)
+            elif (tag.name, tag.color) != (row['name'], row['color']):
+                tag.name, tag.color = row['name'], row['color']
+                changed[tag.slug] = tag
+            else:
+                skipped += 1
+        Tag.assign_bits(new.values())
+        Tag.objects.bulk_create(new.values(), batch_size=batch_size)
+        Tag.objects.bulk_update(changed.values(), ('name', 'color'),
+                                batch_size=batch_size)
+        return len(new), len(changed), skipped
+
     def handle(self, *args, **options):
-        with open('ingredients.json', 'rb') as f:
-            data = json.load(f)
-            for i in data:
-                ingredient = Ingredient()
-                ingredient.name = i['name']
-                ingredient.measurement_unit = i['measurement_unit']
-                ingredient.save()
-                # print(i['name'], i['measurement_unit'])
+        model = options['model']
+        rows = self.read_rows(options['path'], options['format'],
+                              FIELDS[model])
+        loader = getattr(self, 'load_{}'.format(model))
+        catalog = {'ingredients': ingredients_catalog,
+                   'tags': tags_catalog}[model]
+        started = time.monotonic()
+        with transaction.atomic():
+            created, updated, skipped = loader(rows, options['batch_size'])
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(catalog.invalidate)
+        elapsed = time.monotonic() - started
+        total = created + updated + skipped
+        self.stdout.write(self.style.SUCCESS(
+            '{}{}: создано {}, обновлено {}, пропущено {} '
+            '({} строк за {:.2f} с, {:.0f} строк/с)'.format(
+                '[dry-run] ' if options['dry_run'] else '', model,
+                created, updated, skipped, total, elapsed,
+                total / elapsed if elapsed else total
+            )
+        ))
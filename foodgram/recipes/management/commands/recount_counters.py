@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+from api.cache import bump_version  # isort:skip
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики избранного, списков '
+            'покупок, рецептов и подписчиков и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, counter, related_model, field in COUNTERS:
+                actual = count_subquery(related_model, field)
+                drifted = model.objects.annotate(actual=actual).exclude(
+                    **{counter: F('actual')}
+                ).values('pk')
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = model.objects.filter(pk__in=drifted).update(
+                        **{counter: actual}
+                    )
+                self.stdout.write('{}.{}: расхождений {}'.format(
+                    model.__name__, counter, fixed))
+            if not options['dry_run']:
+                # Счётчики входят в ordering=popular и профили авторов.
+                transaction.on_commit(lambda: bump_version('popularity'))
+                transaction.on_commit(lambda: bump_version('authors'))
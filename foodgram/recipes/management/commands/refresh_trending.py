@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.trending import refresh_popularity  # isort:skip
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов с затуханием по времени '
+            'для ordering=trending и /api/recipes/trending/. Запускается '
+            'по расписанию: каждый запуск учитывает только новые '
+            'добавления в избранное и корзину.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Собрать таблицу заново по всем '
+                                 'недавним событиям')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = refresh_popularity(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            'Рецептов с оценкой: {}, {:.1f} с'.format(
+                total, time.perf_counter() - started)))
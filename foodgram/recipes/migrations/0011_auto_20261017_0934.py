@@ -0,0 +1,19 @@
+# Generated by Django 2.2.19 on 2026-10-17 06:34
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_auto_20261017_0930'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='media/recipes/images/', verbose_name='Картинка'),
+        ),
+    ]
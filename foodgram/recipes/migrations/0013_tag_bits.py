@@ -0,0 +1,49 @@
+# Generated by Django 2.2.19 on 2026-10-17 06:46
+
+import recipes.models
+from django.db import migrations, models
+
+MAX_BITS = 63
+
+
+def fill_tag_bits(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    bits = {}
+    for bit, tag in enumerate(Tag.objects.order_by('id')[:MAX_BITS]):
+        tag.bit = bit
+        tag.save(update_fields=['bit'])
+        bits[tag.id] = bit
+    masks = {}
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag_id').iterator():
+        if tag_id in bits:
+            masks[recipe_id] = masks.get(recipe_id, 0) | 1 << bits[tag_id]
+    groups = {}
+    for recipe_id, mask in masks.items():
+        groups.setdefault(mask, []).append(recipe_id)
+    for mask, ids in groups.items():
+        for start in range(0, len(ids), 1000):
+            Recipe.objects.filter(id__in=ids[start:start + 1000]).update(
+                tags_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=recipes.models.BitMaskField(default=0, editable=False, verbose_name='Маска тэгов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске тэгов'),
+        ),
+        migrations.RunPython(fill_tag_bits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.19 on 2026-10-17 07:02
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вектор и GIN-индекс нужны только на PostgreSQL; дальше вектор
+# обновляет api.search.refresh_search_vectors.
+POSTGRES_SQL = (
+    '''
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector('russian', r.name), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(t.name, ' ') FROM recipes_tag t
+            JOIN recipes_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(i.name, ' ') FROM recipes_ingredient i
+            JOIN recipes_ingredientinrecipe ir ON ir.ingredients_id = i.id
+            WHERE ir.recipe_id = r.id), '')), 'C')
+        || setweight(to_tsvector('russian', r.text), 'D')
+    ''',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_tag_bits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_vectors, drop_search_index),
+    ]
@@ -1,8 +1,39 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, Lookup, OuterRef
+from django.utils import timezone
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
+
+class BitMaskField(models.BigIntegerField):
+    pass
+
+
+@BitMaskField.register_lookup
+class BitAny(Lookup):
+    # mask__bitany=bits: установлен хотя бы один из битов.
+    lookup_name = 'bitany'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '(%s & %s) <> 0' % (lhs, rhs), lhs_params + rhs_params
+
+
+@BitMaskField.register_lookup
+class BitAll(Lookup):
+    # mask__bitall=bits: установлены все биты.
+    lookup_name = 'bitall'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '(%s & %s) = %s' % (lhs, rhs, rhs), (
+            lhs_params + rhs_params + rhs_params)
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=256,
@@ -13,6 +44,9 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(name='ingredient_name_idx', fields=('name',)),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -29,6 +63,16 @@ class Tag(models.Model):
         default='d76e00'
     )
     slug = models.SlugField(max_length=100, unique=True, verbose_name='slug')
+    # Номер бита тэга в Recipe.tags_mask; у тэгов сверх MAX_BITS его нет,
+    # и фильтр по ним идёт через JOIN.
+    bit = models.PositiveSmallIntegerField(
+        verbose_name='Бит в маске тэгов',
+        unique=True,
+        null=True,
+        editable=False
+    )
+
+    MAX_BITS = 63
 
     class Meta:
         verbose_name = 'Тэг'
@@ -37,6 +81,26 @@ class Tag(models.Model):
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            Tag.assign_bits([self])
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def assign_bits(cls, tags):
+        # Тэгам без бита — младшие свободные биты по порядку; bulk_create
+        # save() не вызывает, поэтому его вызывающие раздают биты сами.
+        used = set(cls.objects.exclude(bit=None).values_list(
+            'bit', flat=True))
+        free = (bit for bit in range(cls.MAX_BITS) if bit not in used)
+        for tag in tags:
+            if tag.bit is None:
+                tag.bit = next(free, None)
+
+    @property
+    def mask(self):
+        return 0 if self.bit is None else 1 << self.bit
+
 
 class RecipeQuerySet(models.QuerySet):
     def add_flags(self, user_id):
@@ -54,6 +118,25 @@ class RecipeQuerySet(models.QuerySet):
             )
         )
 
+    def refresh_tags_mask(self, batch_size=1000):
+        # Пересчитывает tags_mask по текущим тэгам: одно UPDATE на каждое
+        # различное значение маски в пачке.
+        ids = list(self.values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            masks = dict.fromkeys(batch, 0)
+            for recipe_id, bit in Recipe.tags.through.objects.filter(
+                    recipe_id__in=batch, tag__bit__isnull=False
+            ).values_list('recipe_id', 'tag__bit'):
+                masks[recipe_id] |= 1 << bit
+            groups = {}
+            for recipe_id, mask in masks.items():
+                groups.setdefault(mask, []).append(recipe_id)
+            now = timezone.now()
+            for mask, recipe_ids in groups.items():
+                Recipe.objects.filter(id__in=recipe_ids).update(
+                    tags_mask=mask, updated_at=now)
+
 
 class Recipe(models.Model):
     name = models.CharField(
@@ -83,7 +166,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name="Картинка",
-        upload_to='media/recipes/images/'
+        upload_to='media/recipes/images/',
+        storage=ContentAddressedStorage()
     )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name="Время приготовления в минутах",
@@ -96,12 +180,44 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(verbose_name="Дата публикации",
                                     auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name="Дата изменения",
+                                      auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="Добавлений в избранное",
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name="Добавлений в список покупок",
+        default=0,
+        editable=False
+    )
+    tags_mask = BitMaskField(
+        verbose_name="Маска тэгов",
+        default=0,
+        editable=False
+    )
+    # Заполняется только на PostgreSQL (см. api.search).
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        null=True,
+        editable=False
+    )
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(name='recipe_pub_date_idx',
+                         fields=('-pub_date', '-id')),
+            models.Index(name='recipe_author_pub_date_idx',
+                         fields=('author', '-pub_date')),
+            models.Index(name='recipe_popular_idx',
+                         fields=('-favorites_count', '-shopping_cart_count',
+                                 '-pub_date')),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -154,6 +270,13 @@ class Favorite(models.Model):
         verbose_name='Рецепт, на который подпишемся',
         related_name='favorites'
     )
+    # У добавленных до появления поля дата неизвестна.
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        null=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Подписка на рецепт'
@@ -182,6 +305,12 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт, который добавим в корзину',
         related_name='shopping_cart'
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        null=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -195,3 +324,95 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Результат: {self.user}  добавил в корзину {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации рецепта")
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_feed_user_recipe",
+                fields=('user', 'recipe'),
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='feed_user_pub_date_idx',
+                fields=('user', '-pub_date', '-recipe'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe} в ленте {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_similar_recipe",
+                fields=('recipe', 'similar'),
+            ),
+        ]
+        indexes = [
+            models.Index(name='similar_recipe_score_idx',
+                         fields=('recipe', '-score')),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class RecipePopularity(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(verbose_name='Популярность')
+    refreshed_at = models.DateTimeField(verbose_name='Дата пересчёта')
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(name='recipe_popularity_score_idx',
+                         fields=('-score',)),
+        ]
+
+    def __str__(self):
+        return f'Популярность {self.recipe}: {self.score:.2f}'
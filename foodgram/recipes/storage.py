@@ -0,0 +1,25 @@
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_HASH_NAME = re.compile(r'^[0-9a-f]{64}(_\w+)?\.\w+$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Если имя файла — хэш содержимого, совпадение имени означает тот же
+    # файл: повторная загрузка не создаёт копию. Остальные имена (например,
+    # загруженные через админку) получают суффикс как обычно.
+
+    def is_content_addressed(self, name):
+        return bool(CONTENT_HASH_NAME.match(os.path.basename(name)))
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if self.is_content_addressed(name) and self.exists(name):
+            return name
+        return super()._save(name, content)
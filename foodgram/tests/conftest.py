@@ -0,0 +1,94 @@
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient,  # isort:skip
+                            IngredientInRecipe, Recipe,  # isort:skip
+                            ShoppingCart, Tag)  # isort:skip
+from users.models import Follow  # isort:skip
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(settings, tmp_path):
+    # Версии, фрагменты и индексы в памяти переживают откат транзакции
+    # теста, а id рецептов в новой транзакции повторяются.
+    settings.MEDIA_ROOT = str(tmp_path)
+    clear_caches()
+    yield
+    clear_caches()
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='user', email='user@example.org', password='pass12345xx')
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        username='author', email='author@example.org',
+        password='pass12345xx')
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [Tag.objects.create(name='Тэг {}'.format(i),
+                               slug='tag{}'.format(i),
+                               color='#00000{}'.format(i))
+            for i in range(3)]
+
+
+@pytest.fixture
+def ingredients():
+    Ingredient.objects.bulk_create(
+        Ingredient(name='Ингредиент {}'.format(i), measurement_unit='г')
+        for i in range(40)
+    )
+    return list(Ingredient.objects.order_by('id'))
+
+
+@pytest.fixture
+def recipes(user, author, tags, ingredients):
+    Follow.objects.create(user=user, author=author)
+    created = []
+    for i in range(12):
+        recipe = Recipe.objects.create(
+            author=author if i % 2 else user, name='Рецепт {}'.format(i),
+            text='Описание', cooking_time=i + 1, image='recipes/test.png')
+        recipe.tags.set(tags[:1 + i % 3])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredients=ingredient,
+                               amount=i + 1)
+            for ingredient in ingredients[i:i + 5]
+        )
+        if i % 3 == 0:
+            Favorite.objects.create(user=user, recipe=recipe)
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        created.append(recipe)
+    return created
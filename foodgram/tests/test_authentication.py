@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import TokenCache  # isort:skip
+
+
+def token_queries(client):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/users/me/')
+    return response, [query['sql'] for query in queries.captured_queries
+                      if 'authtoken_token' in query['sql']]
+
+
+@pytest.fixture
+def token_client(user):
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    return token, client
+
+
+@pytest.mark.django_db
+def test_default_settings_skip_token_query(token_client):
+    token, client = token_client
+    response, queries = token_queries(client)
+    assert response.status_code == 200
+    assert len(queries) == 1
+    response, queries = token_queries(client)
+    assert response.status_code == 200
+    assert queries == []
+
+
+@pytest.mark.django_db
+def test_deleted_token_is_rejected(token_client):
+    token, client = token_client
+    assert client.get('/api/users/me/').status_code == 200
+    token.delete()
+    assert client.get('/api/users/me/').status_code == 401
+
+
+@pytest.mark.django_db
+def test_user_version_invalidates_cached_token(user):
+    cache = TokenCache(10, 60)
+    cache.set('key', user)
+    assert cache.get('key') == user
+    cache.invalidate_user(user.id)
+    assert cache.get('key') is None
+
+
+@pytest.mark.django_db
+def test_entry_expires_after_ttl(user, monkeypatch):
+    # Так отзыв доходит до воркера, которому не видна смена версии.
+    cache = TokenCache(10, 60)
+    cache.set('key', user)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+    assert cache.get('key') is None
@@ -0,0 +1,32 @@
+import pytest
+from django.db import transaction
+
+from api.autocomplete import ingredients_index  # isort:skip
+from api.cache import get_version  # isort:skip
+from recipes.models import Ingredient, Tag  # isort:skip
+
+
+@pytest.mark.django_db(transaction=True)
+def test_tags_catalog_version_changes_on_commit():
+    version = get_version('tags')
+    with transaction.atomic():
+        Tag.objects.create(name='Завтрак', slug='breakfast', color='#ffffff')
+        assert get_version('tags') == version
+    assert get_version('tags') != version
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ingredients_catalog_version_changes_on_commit():
+    assert ingredients_index.search('сол', 10) == []
+    version = get_version('ingredients')
+    with transaction.atomic():
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        assert get_version('ingredients') == version
+    assert get_version('ingredients') != version
+    assert [item['id'] for item in ingredients_index.search('сол', 10)] == [
+        ingredient.id]
+    with transaction.atomic():
+        ingredient.delete()
+        assert ingredients_index.search('сол', 10) != []
+    assert ingredients_index.search('сол', 10) == []
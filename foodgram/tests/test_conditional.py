@@ -0,0 +1,92 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from api.images import variant_builder  # isort:skip
+from api.similar import similar_refresher  # isort:skip
+from recipes.models import Favorite, Recipe  # isort:skip
+
+
+@pytest.fixture(autouse=True)
+def no_similar_refresh(monkeypatch):
+    # Фоновый пересчёт похожих рецептов упирается в блокировку SQLite
+    # в транзакционных тестах.
+    monkeypatch.setattr(similar_refresher, 'schedule', lambda ids: None)
+
+
+def revalidate(client, url, etag):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    return response, len(queries)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url', (
+    '/api/recipes/', '/api/recipes/?tags=tag1&limit=3',
+    '/api/recipes/?cursor=', '/api/recipes/?ordering=popular',
+))
+def test_list_not_modified_without_queries(user_client, recipes, url):
+    etag = user_client.get(url)['ETag']
+    response, count = revalidate(user_client, url, etag)
+    assert response.status_code == 304
+    assert count == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_list_etag_changes_with_recipes(user_client, recipes):
+    url = '/api/recipes/'
+    etag = user_client.get(url)['ETag']
+    assert user_client.get('/api/recipes/?limit=2')['ETag'] != etag
+    Recipe.objects.get(pk=recipes[0].pk).save()
+    response, _ = revalidate(user_client, url, etag)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_popular_etag_changes_with_favorites(user_client, author, recipes):
+    url = '/api/recipes/?ordering=popular'
+    etag = user_client.get(url)['ETag']
+    plain = user_client.get('/api/recipes/')['ETag']
+    Favorite.objects.create(user=author, recipe=recipes[1])
+    assert revalidate(user_client, url, etag)[0].status_code == 200
+    assert revalidate(
+        user_client, '/api/recipes/', plain)[0].status_code == 304
+
+
+@pytest.mark.django_db(transaction=True)
+def test_detail_etag_follows_updated_at(user_client, recipes):
+    url = '/api/recipes/{}/'.format(recipes[0].pk)
+    etag = user_client.get(url)['ETag']
+    response, count = revalidate(user_client, url, etag)
+    assert response.status_code == 304
+    assert count == 1
+    Recipe.objects.get(pk=recipes[1].pk).save()
+    assert revalidate(user_client, url, etag)[0].status_code == 304
+    Recipe.objects.get(pk=recipes[0].pk).save()
+    assert revalidate(user_client, url, etag)[0].status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_etag_changes_when_variants_are_built(user_client, author,
+                                              monkeypatch):
+    monkeypatch.setattr(variant_builder, 'schedule', lambda name: None)
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), 'green').save(buffer, 'PNG')
+    recipe = Recipe(author=author, name='С картинкой', text='Текст',
+                    cooking_time=1)
+    recipe.image.save('picture.png', ContentFile(buffer.getvalue()),
+                      save=False)
+    recipe.save()
+    urls = ('/api/recipes/', '/api/recipes/{}/'.format(recipe.id))
+    etags = [user_client.get(url)['ETag'] for url in urls]
+    variant_builder.build(recipe.image.name)
+    for url, etag in zip(urls, etags):
+        response, _ = revalidate(user_client, url, etag)
+        assert response.status_code == 200
+        data = response.json()
+        data = data['results'][0] if 'results' in data else data
+        assert '/variants/' in data['image']
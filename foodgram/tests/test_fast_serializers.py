@@ -0,0 +1,53 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import serialize_recipes  # isort:skip
+from api.fragments import recipe_fragments  # isort:skip
+from api.images import build_variants  # isort:skip
+from recipes.models import Recipe  # isort:skip
+
+
+def render(built, ids):
+    return JSONRenderer().render([built[pk][1] for pk in ids])
+
+
+def assert_same(ids):
+    # Сборка из .values() должна давать побайтно тот же JSON, что и
+    # RecipeGetSerializer, — иначе FAST_READ_SERIALIZERS меняет ответ.
+    for pk in ids:
+        assert render(serialize_recipes([pk]), [pk]) == render(
+            recipe_fragments.serialize([pk], {}), [pk])
+    assert render(serialize_recipes(ids), ids) == render(
+        recipe_fragments.serialize(ids, {}), ids)
+
+
+@pytest.mark.django_db
+def test_fast_serializer_matches_drf(recipes):
+    assert_same([recipe.id for recipe in recipes])
+
+
+@pytest.mark.django_db
+def test_fast_serializer_matches_drf_edge_cases(author, ingredients):
+    # Без тэгов и ингредиентов, с пустым именем автора и с готовыми
+    # вариантами картинки.
+    author.first_name = ''
+    author.save()
+    bare = Recipe.objects.create(author=author, name='Пустой «рецепт» 🍲',
+                                 text='', cooking_time=1,
+                                 image='recipes/missing.png')
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), 'green').save(buffer, 'PNG')
+    pictured = Recipe(author=author, name='С картинкой', text='Текст\n',
+                      cooking_time=2)
+    pictured.image.save('picture.png', ContentFile(buffer.getvalue()),
+                        save=False)
+    pictured.save()
+    build_variants(pictured.image.name)
+    assert_same([bare.id, pictured.id])
+    data = serialize_recipes([pictured.id])[pictured.id][1]
+    assert data['image_webp'].endswith('.webp')
+    assert data['image'] != data['image_webp']
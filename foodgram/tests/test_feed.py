@@ -0,0 +1,31 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.similar import similar_refresher  # isort:skip
+from recipes.models import Recipe  # isort:skip
+from users.models import Follow  # isort:skip
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_keeps_recipes_after_author_returns_to_push(
+        settings, django_user_model, user, user_client, author, monkeypatch):
+    monkeypatch.setattr(similar_refresher, 'schedule', lambda ids: None)
+    settings.FEED_FANOUT_MAX_FOLLOWERS = 1
+    other = django_user_model.objects.create_user(
+        username='other', email='other@example.org', password='pass12345xx')
+    other_client = APIClient()
+    other_client.force_authenticate(other)
+    for client in (user_client, other_client):
+        url = '/api/users/{}/subscribe/'.format(author.id)
+        assert client.post(url).status_code == 201
+    recipe = Recipe.objects.create(author_id=author.id, name='Рецепт',
+                                   text='Описание', cooking_time=1,
+                                   image='recipes/test.png')
+    assert Follow.objects.filter(author=author).count() == 2
+    feed = user_client.get('/api/recipes/feed/').json()['results']
+    assert [item['id'] for item in feed] == [recipe.id]
+
+    url = '/api/users/{}/subscribe/'.format(author.id)
+    assert other_client.delete(url).status_code == 204
+    feed = user_client.get('/api/recipes/feed/').json()['results']
+    assert [item['id'] for item in feed] == [recipe.id]
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from api import images  # isort:skip
+from api.images import LRUSet, build_variants, variant_url  # isort:skip
+from recipes.models import Recipe  # isort:skip
+
+
+def picture(author, name, mode, image_format):
+    buffer = io.BytesIO()
+    # Полупрозрачный цвет: полностью непрозрачный альфа-канал WebP
+    # не сохраняет.
+    color = (0, 128, 0, 128)[:len(mode)]
+    Image.new(mode, (800, 600), color).save(buffer, image_format)
+    recipe = Recipe(author=author, name=name, text='Текст', cooking_time=1)
+    recipe.image.save(name, ContentFile(buffer.getvalue()), save=False)
+    recipe.save()
+    return recipe.image
+
+
+def variant_format(image, url):
+    path = url[len(image.storage.base_url):]
+    with image.storage.open(path) as f:
+        return Image.open(f).format
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, mode, image_format, extension, fallback', (
+    ('photo.jpg', 'RGB', 'JPEG', '.jpg', 'JPEG'),
+    ('photo.png', 'RGBA', 'PNG', '.png', 'PNG'),
+    ('photo.webp', 'RGB', 'WEBP', '.jpg', 'JPEG'),
+    ('logo.webp', 'RGBA', 'WEBP', '.png', 'PNG'),
+))
+def test_variant_extension_matches_content(author, name, mode, image_format,
+                                           extension, fallback):
+    image = picture(author, name, mode, image_format)
+    build_variants(image.name)
+    url, webp_url = (variant_url(image, 'card', webp)
+                     for webp in (False, True))
+    assert url.endswith('_card' + extension)
+    assert webp_url.endswith('_card.webp')
+    assert variant_format(image, url) == fallback
+    assert variant_format(image, webp_url) == 'WEBP'
+    assert build_variants(image.name) == []
+    assert len(build_variants(image.name, force=True)) == 4
+
+
+@pytest.mark.django_db
+def test_webp_url_is_empty_until_variant_exists(author, monkeypatch):
+    monkeypatch.setattr(images.variant_builder, 'schedule', lambda name: None)
+    image = picture(author, 'pending.png', 'RGB', 'PNG')
+    assert variant_url(image, 'card') == image.url
+    assert variant_url(image, 'card', webp=True) is None
+    build_variants(image.name)
+    assert variant_url(image, 'card', webp=True).endswith('_card.webp')
+
+
+def test_lru_set_is_bounded():
+    names = LRUSet(2)
+    for name in ('a', 'b', 'a', 'c'):
+        names.add(name)
+    assert len(names) == 2
+    assert 'a' in names and 'c' in names and 'b' not in names
@@ -0,0 +1,20 @@
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from recipes.models import Ingredient  # isort:skip
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('item', (
+    'соль', 42, ['соль', 'г'], None, {'name': 'соль'},
+    {'name': 1, 'measurement_unit': 'г'},
+))
+def test_bad_json_row_names_its_number(tmp_path, item):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': 'сахар', 'measurement_unit': 'г'}, item]))
+    with pytest.raises(CommandError, match='№2'):
+        call_command('load_data', str(path))
+    assert not Ingredient.objects.exists()
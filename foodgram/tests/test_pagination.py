@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from recipes.models import Recipe  # isort:skip
+from users.models import Follow  # isort:skip
+
+PUB_DATE = datetime(2022, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+
+def encode(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def walk(client, url, params):
+    ids = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        ids += [item['id'] for item in data['results']]
+        if not data['next']:
+            return ids
+        response = client.get(data['next'])
+
+
+@pytest.fixture
+def same_time_recipes(author):
+    # Все рецепты в одну миллисекунду: курсор должен различать их по
+    # микросекундам и id.
+    Recipe.objects.bulk_create(
+        Recipe(author=author, name='Рецепт {}'.format(i), text='Текст',
+               cooking_time=1, image='recipes/test.png')
+        for i in range(25)
+    )
+    recipes = Recipe.objects.filter(author=author)
+    recipes.update(pub_date=PUB_DATE)
+    for i, recipe in enumerate(recipes.order_by('id')[:10]):
+        Recipe.objects.filter(id=recipe.id).update(
+            pub_date=PUB_DATE.replace(microsecond=123000 + i))
+    return list(recipes.order_by('-pub_date', '-id').values_list(
+        'id', flat=True))
+
+
+@pytest.mark.django_db
+def test_cursor_walk_returns_every_recipe(user_client, same_time_recipes):
+    ids = walk(user_client, '/api/recipes/', {'cursor': '', 'limit': 5})
+    assert ids == same_time_recipes
+
+
+@pytest.mark.django_db
+def test_feed_walk_returns_every_recipe(user, user_client, author,
+                                        same_time_recipes):
+    Follow.objects.create(user=user, author=author)
+    ids = walk(user_client, '/api/recipes/feed/', {'limit': 5})
+    assert ids == same_time_recipes
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cursor', (
+    'не base64',
+    base64.urlsafe_b64encode(b'{not json').decode(),
+    encode(['2022-03-01T12:00:00+00:00']),
+    encode(['2022-13-01T12:00:00+00:00', 1]),
+    encode(['вчера', 1]),
+    encode([1, 1]),
+    encode(['2022-03-01T12:00:00+00:00', '1']),
+    encode(['2022-03-01T12:00:00+00:00', True]),
+    encode({'pub_date': 1}),
+))
+@pytest.mark.parametrize('url', ('/api/recipes/', '/api/recipes/feed/'))
+def test_malformed_cursor_is_not_found(user_client, url, cursor):
+    response = user_client.get(url, {'cursor': cursor})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {'ordering': 'popular'}, {'ordering': 'trending'}, {'search': 'рецепт'},
+))
+def test_cursor_with_custom_ordering_is_rejected(user_client, recipes,
+                                                 params):
+    response = user_client.get('/api/recipes/', dict(params, cursor=''))
+    assert response.status_code == 400
+    assert 'cursor' in response.json()
+    assert user_client.get('/api/recipes/', params).status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ('/api/recipes/', '/api/users/'))
+def test_cursor_with_default_ordering(user_client, recipes, url):
+    response = user_client.get(url, {'cursor': '', 'tags': 'tag0'})
+    assert response.status_code == 200
+    assert response.json()['results']
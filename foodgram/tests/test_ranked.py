@@ -0,0 +1,50 @@
+import pytest
+from django.conf import settings
+
+from api.similar import build_all  # isort:skip
+from api.trending import refresh_popularity  # isort:skip
+from recipes.models import Recipe  # isort:skip
+
+
+def check_cards(items, recipes, field):
+    names = {recipe.id: recipe.name for recipe in recipes}
+    assert items
+    for item in items:
+        assert item['name'] == names[item['id']]
+        assert 'is_favorited' in item and field in item
+
+
+@pytest.mark.django_db
+def test_trending_adds_popularity(user_client, recipes):
+    refresh_popularity()
+    results = user_client.get('/api/recipes/trending/').json()['results']
+    check_cards(results, recipes, 'popularity')
+    assert {item['id'] for item in results} == {
+        recipe.id for recipe in recipes[::3]}
+
+
+@pytest.mark.django_db
+def test_match_adds_counts_and_skips_deleted(user_client, recipes,
+                                             ingredients):
+    url = '/api/recipes/match/?' + '&'.join(
+        'ingredients={}'.format(ingredient.id)
+        for ingredient in ingredients[:3])
+    results = user_client.get(url).json()['results']
+    check_cards(results, recipes, 'match_ratio')
+    assert results[0]['id'] == recipes[0].id
+    assert results[0]['missing_count'] == 2
+    Recipe.objects.filter(pk=recipes[0].pk).delete()
+    results = user_client.get(url).json()['results']
+    assert recipes[0].id not in {item['id'] for item in results}
+
+
+@pytest.mark.django_db
+def test_similar_adds_similarity(user_client, recipes):
+    for _ in build_all(settings.SIMILAR_RECIPES_TOP_K, 100,
+                       settings.SIMILAR_RECIPES_MAX_DF):
+        pass
+    results = user_client.get(
+        '/api/recipes/{}/similar/'.format(recipes[4].id)).json()
+    check_cards(results, recipes, 'similarity')
+    scores = [item['similarity'] for item in results]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,63 @@
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import fragments  # isort:skip
+
+
+def count_queries(client, url, params):
+    # Пустой кэш: каждая страница собирается из базы целиком.
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, params)
+    assert response.status_code == 200
+    return len(queries), response.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fast', (True, False))
+@pytest.mark.parametrize(
+    'params', ({}, {'is_favorited': 1}, {'tags': 'tag0'}))
+def test_list_queries_do_not_depend_on_page_size(
+        settings, user_client, recipes, fast, params):
+    settings.FAST_READ_SERIALIZERS = fast
+    small, data = count_queries(user_client, '/api/recipes/',
+                                dict(params, limit=1))
+    assert len(data['results']) == 1
+    large, data = count_queries(user_client, '/api/recipes/',
+                                dict(params, limit=10))
+    assert len(data['results']) > 1
+    assert small == large
+
+
+@pytest.mark.django_db
+def test_list_queries_for_guest(api_client, recipes):
+    small, _ = count_queries(api_client, '/api/recipes/', {'limit': 1})
+    large, _ = count_queries(api_client, '/api/recipes/', {'limit': 10})
+    assert small == large
+
+
+@pytest.mark.django_db
+def test_list_flags(user_client, user, recipes):
+    _, data = count_queries(user_client, '/api/recipes/', {'limit': 12})
+    favorited = {recipe.id for recipe in recipes[::3]}
+    for item in data['results']:
+        assert item['is_favorited'] == (item['id'] in favorited)
+        assert item['is_in_shopping_cart'] == (item['id'] in favorited)
+        assert item['author']['is_subscribed'] == (
+            item['author']['id'] != user.id)
+
+
+@pytest.mark.django_db
+def test_fragments_use_their_own_cache(user_client, recipes, monkeypatch):
+    # Фрагменты не должны вытеснять версии и справочники из default.
+    monkeypatch.setattr(fragments, 'variants_ready', lambda *args: True)
+    assert user_client.get('/api/recipes/').status_code == 200
+    default = [key for key in caches['default']._cache if ':recipe:' in key]
+    stored = [key for key in caches['fragments']._cache
+              if ':recipe:' in key]
+    assert default == []
+    assert len(stored) == 8
@@ -0,0 +1,99 @@
+import base64
+import io
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from recipes.models import IngredientInRecipe  # isort:skip
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def payload(number, tags, amounts):
+    return {
+        'name': 'Рецепт {}'.format(number), 'text': 'Описание',
+        'cooking_time': 5, 'image': image_data(),
+        'tags': [tag.id for tag in tags],
+        'ingredients': [{'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in amounts.items()],
+    }
+
+
+def send(client, method, url, data):
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, data, format='json')
+    assert response.status_code in (200, 201), response.json()
+    return len(queries), response.json()['id']
+
+
+def create(client, data):
+    return send(client, 'post', '/api/recipes/', data)
+
+
+def update(client, recipe_id, data):
+    return send(client, 'patch', '/api/recipes/{}/'.format(recipe_id), data)
+
+
+def saved(recipe_id):
+    return dict(IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id).values_list('ingredients_id', 'amount'))
+
+
+def expected(amounts):
+    return {ingredient.id: amount for ingredient, amount in amounts.items()}
+
+
+@pytest.mark.django_db
+def test_create_queries_do_not_depend_on_ingredients(user_client, tags,
+                                                     ingredients):
+    counts = []
+    for size in (2, 30):
+        amounts = {ingredient: 1 for ingredient in ingredients[:size]}
+        count, recipe_id = create(user_client, payload(size, tags, amounts))
+        assert saved(recipe_id) == expected(amounts)
+        counts.append(count)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_update_queries_do_not_depend_on_ingredients(user_client, tags,
+                                                     ingredients):
+    # Каждая правка меняет количество, удаляет и добавляет по size
+    # ингредиентов.
+    counts = []
+    for size in (1, 10):
+        before = {ingredient: 1 for ingredient in ingredients[:3 * size]}
+        _, recipe_id = create(user_client, payload(size, tags, before))
+        after = dict(before)
+        for ingredient in ingredients[:size]:
+            after[ingredient] = 7
+        for ingredient in ingredients[size:2 * size]:
+            del after[ingredient]
+        for ingredient in ingredients[3 * size:4 * size]:
+            after[ingredient] = 3
+        count, _ = update(user_client, recipe_id, payload(size, tags, after))
+        assert saved(recipe_id) == expected(after)
+        counts.append(count)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_remove_queries_do_not_depend_on_ingredients(user_client, tags,
+                                                     ingredients):
+    counts = []
+    for removed in (1, 29):
+        before = {ingredient: 1 for ingredient in ingredients[:30]}
+        _, recipe_id = create(user_client, payload(removed, tags, before))
+        after = {ingredient: 1 for ingredient in ingredients[removed:30]}
+        count, _ = update(user_client, recipe_id,
+                          payload(removed, tags, after))
+        assert saved(recipe_id) == expected(after)
+        counts.append(count)
+    assert counts[0] == counts[1]
@@ -0,0 +1,48 @@
+import pytest
+from django.conf import settings
+
+from api import similar  # isort:skip
+from api.pantry import pantry_index  # isort:skip
+from recipes.models import IngredientInRecipe, SimilarRecipe  # isort:skip
+
+
+def stored(recipe_id):
+    return list(SimilarRecipe.objects.filter(recipe_id=recipe_id).order_by(
+        '-score', '-similar_id').values_list('similar_id', 'score'))
+
+
+@pytest.fixture
+def weights(monkeypatch):
+    weights = similar.SimilarWeights()
+    monkeypatch.setattr(similar, 'similar_weights', weights)
+    return weights
+
+
+@pytest.mark.django_db
+def test_refresh_matches_full_vectors_without_rebuilding(
+        recipes, ingredients, weights, monkeypatch):
+    k, max_df = settings.SIMILAR_RECIPES_TOP_K, settings.SIMILAR_RECIPES_MAX_DF
+    recipe = recipes[3]
+    IngredientInRecipe.objects.filter(recipe=recipe).delete()
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredients=ingredient, amount=1)
+        for ingredient in ingredients[:3] + ingredients[8:10])
+    similar.refresh([recipe.id], k, max_df)
+    expected = similar.IngredientVectors.from_index(
+        pantry_index, max_df).neighbours([recipe.id], k)[recipe.id]
+    assert [pk for pk, _ in stored(recipe.id)] == [pk for pk, _ in expected]
+    assert [score for _, score in stored(recipe.id)] == pytest.approx(
+        [score for _, score in expected])
+
+    def rebuild(*args):
+        raise AssertionError('веса пересобраны заново')
+
+    monkeypatch.setattr(similar.IngredientVectors, 'from_index', rebuild)
+    monkeypatch.setattr(weights, 'build', rebuild)
+    IngredientInRecipe.objects.filter(
+        recipe=recipe, ingredients=ingredients[0]).delete()
+    similar.refresh([recipe.id], k, max_df)
+    assert ingredients[0].id not in {
+        pk for pk, posting in pantry_index.postings.items()
+        if recipe.id in posting}
+    assert stored(recipe.id)
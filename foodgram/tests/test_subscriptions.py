@@ -0,0 +1,14 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.mark.django_db
+def test_subscriptions_are_subscribed_without_subquery(user_client, recipes):
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.get('/api/users/subscriptions/')
+    results = response.json()['results']
+    assert results
+    assert all(item['is_subscribed'] is True for item in results)
+    assert not any('EXISTS' in query['sql']
+                   for query in queries.captured_queries)
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Tag  # isort:skip
+
+
+@pytest.fixture
+def loaded_tags(tmp_path, tags):
+    # Тэги из фикстуры заняли биты 0-2; один бит освобождаем.
+    Tag.objects.filter(slug='tag1').delete()
+    path = tmp_path / 'tags.json'
+    path.write_text(json.dumps([
+        {'name': 'Загруженный {}'.format(i), 'slug': 'loaded{}'.format(i),
+         'color': '#00000{}'.format(i)}
+        for i in range(3)
+    ]))
+    call_command('load_data', str(path), model='tags')
+    return list(Tag.objects.filter(slug__startswith='loaded').order_by('id'))
+
+
+@pytest.mark.django_db
+def test_load_data_assigns_lowest_free_bits(loaded_tags):
+    assert [tag.bit for tag in loaded_tags] == [1, 3, 4]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('match', ('any', 'all'))
+def test_tags_filter_uses_mask_without_join(user_client, recipes,
+                                            loaded_tags, match):
+    recipes[0].tags.add(*loaded_tags[:2])
+    recipes[1].tags.add(loaded_tags[0])
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.get('/api/recipes/', {
+            'tags': ['loaded0', 'loaded1'], 'tags_match': match})
+    expected = {recipes[0].id} if match == 'all' else {
+        recipes[0].id, recipes[1].id}
+    assert {item['id'] for item in response.json()['results']} == expected
+    # Откат на JOIN с recipes_recipe_tags добавил бы DISTINCT.
+    sql = [query['sql'] for query in queries.captured_queries]
+    assert any('tags_mask' in query for query in sql)
+    assert not any('DISTINCT' in query for query in sql)
@@ -3,6 +3,13 @@ from recipes.models import ShoppingCart
 
 from .models import Follow, User
 
-admin.site.register(User)
+
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('id', 'username', 'email', 'recipes_count',
+                    'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
+
+
+admin.site.register(User, UserAdmin)
 admin.site.register(Follow)
 admin.site.register(ShoppingCart)
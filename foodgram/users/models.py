@@ -4,6 +4,16 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
 
 class ConfirmCodes(models.Model):
@@ -47,6 +57,10 @@ class Follow(models.Model):
                 name="prevent_self_follow",
                 check=~models.Q(user=models.F("author")),
             ),
+            models.UniqueConstraint(
+                name="unique_follow_user_author",
+                fields=('user', 'author'),
+            ),
         ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'